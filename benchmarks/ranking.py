@@ -0,0 +1,40 @@
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from utils.ranking import select, select_batch
+
+"""
+Compares utils.ranking.select with the previous sort-and-slice
+selection of Momentum.rebalance on random formation returns.
+
+python -m benchmarks.ranking
+"""
+
+
+def previous_select(returns: pd.Series, losers_amount: int, winners_amount: int):
+    returns = returns.dropna().sort_values()
+    return returns.loc[returns < 0][:losers_amount], returns.loc[returns > 0.01][-winners_amount:]
+
+
+if __name__ == "__main__":
+    random = np.random.RandomState(42)
+    for tickers in [300, 3000, 30000]:
+        values = random.normal(0, 0.2, tickers)
+        values[random.rand(tickers) < 0.05] = np.nan
+        series = pd.Series(values)
+
+        losers, winners = select(values, 10, 10)
+        expected_losers, expected_winners = previous_select(series, 10, 10)
+        assert set(losers) == set(expected_losers.index) and set(winners) == set(expected_winners.index)
+
+        for name, func in [('sort', lambda: previous_select(series, 10, 10)),
+                           ('argpartition', lambda: select(values, 10, 10))]:
+            best = min(timeit.Timer(func).repeat(repeat=5, number=100))
+            print('{:>6} tickers {:>12}: {:8.1f} us per call'.format(tickers, name, best / 100 * 10 ** 6))
+
+        matrix = random.normal(0, 0.2, (5, tickers))
+        amounts = [(10, 10), (20, 0), (0, 20)]
+        best = min(timeit.Timer(lambda: select_batch(matrix, amounts)).repeat(repeat=5, number=100))
+        print('{:>6} tickers {:>12}: {:8.1f} us per call'.format(tickers, '5 J x 3 N', best / 100 * 10 ** 6))
@@ -0,0 +1,42 @@
+import timeit
+from datetime import timedelta
+
+from trading_calendars import get_calendar
+
+from utils.trading_utils import sessions_in_range
+
+"""
+Compares utils.trading_utils.sessions_in_range with the
+previous get_calendar('XMOS').sessions_in_range call on
+the formation windows of a monthly rebalance schedule.
+
+python -m benchmarks.sessions
+"""
+
+
+def previous_sessions_in_range(first_date, last_date):
+    return get_calendar('XMOS').sessions_in_range(first_date, last_date)
+
+
+def rebalance_windows():
+    sessions = get_calendar('XMOS').sessions_in_range('2012-01-03', '2018-12-29')
+    month_starts = sessions[sessions.to_series().dt.month.diff().fillna(1) != 0]
+    windows = []
+    for today in month_starts:
+        today = today + timedelta(hours=15, minutes=45)
+        for J in [1, 3, 6, 9, 12]:
+            windows.append((today - timedelta(days=(J + 1) * 30), today - timedelta(days=30)))
+        windows.append((today - timedelta(days=400), today))
+    return windows
+
+
+if __name__ == "__main__":
+    windows = rebalance_windows()
+
+    for first_date, last_date in windows:
+        assert sessions_in_range(first_date, last_date).equals(previous_sessions_in_range(first_date, last_date))
+
+    for name, func in [('get_calendar', previous_sessions_in_range), ('session calendar', sessions_in_range)]:
+        timer = timeit.Timer(lambda: [func(first_date, last_date) for first_date, last_date in windows])
+        best = min(timer.repeat(repeat=5, number=10))
+        print('{:>16}: {:8.2f} us per call'.format(name, best / 10 / len(windows) * 10 ** 6))
@@ -0,0 +1,69 @@
+import argparse
+import subprocess
+import sys
+import time
+
+"""
+Import time of the modules every pool worker and CLI entry point loads,
+each measured in a fresh interpreter. On Python 3.7+ the breakdown of
+python -X importtime names the slowest imports; older interpreters only
+report the wall time. Exits with 1 when a module takes longer than --max-seconds.
+
+python -m benchmarks.startup --max-seconds 2
+"""
+
+MODULES = ['strategies.momentum', 'strategies.ts_momentum', 'strategies.vectorized', 'main', 'metrics']
+
+# Imported only on first use, their presence after importing a module is a regression
+LAZY = ['zipline', 'pyfolio', 'empyrical', 'matplotlib', 'trading_calendars']
+
+
+def wall_time(module: str, repeat=3) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.time()
+        subprocess.check_call([sys.executable, '-c', 'import {}'.format(module)])
+        timings.append(time.time() - started)
+    return min(timings)
+
+
+def eager_imports(module: str) -> list:
+    code = 'import sys, {}; print(" ".join(sorted(sys.modules)))'.format(module)
+    loaded = set(subprocess.check_output([sys.executable, '-c', code]).decode().split())
+    return [name for name in LAZY if name in loaded]
+
+
+def slowest_imports(module: str, top=10) -> list:
+    # Lines look like "import time:       512 |      10340 | package.module"
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                            stderr=subprocess.PIPE, check=True).stderr.decode()
+    rows = []
+    for line in output.splitlines():
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import time of the strategy modules')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--max-seconds', type=float, default=None)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    failed = []
+    for module in args.modules:
+        seconds = wall_time(module)
+        eager = eager_imports(module)
+        print('{:>24}: {:6.2f} s{}'.format(module, seconds, ', loads ' + ', '.join(eager) if eager else ''))
+        if sys.version_info >= (3, 7):
+            for cumulative, name in slowest_imports(module, args.top):
+                print('{:>24}  {:8.1f} ms {}'.format('', cumulative / 1000, name))
+        if args.max_seconds is not None and seconds > args.max_seconds:
+            failed.append(module)
+
+    if failed:
+        print('Slower than {} s: {}'.format(args.max_seconds, ', '.join(failed)))
+        sys.exit(1)
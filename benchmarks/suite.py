@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+"""
+Benchmarks bundle ingest, one Momentum and one TSMomentum zipline run,
+the rebalance kernels and the full J x K sweep on a synthetic universe
+(benchmarks.synthetic). Every stage runs in a freshly spawned process, not
+a fork, so its peak RSS holds no pages inherited from this one. Results are
+appended to a history file and compared with the median of earlier runs of
+the same configuration; a stage slower by more than --threshold is reported
+as a regression (exit code 1).
+
+python -m benchmarks.suite --tickers 200 --years 5
+"""
+
+BUNDLE = 'synthetic'
+STAGES = ['ingest', 'momentum', 'ts_momentum', 'kernels', 'sweep']
+
+
+def configure(config: dict) -> None:
+    # Point the data layer and zipline at the benchmark's own database and bundle directory
+    workdir = Path(config['workdir'])
+    os.environ['DATABASE_URL'] = 'sqlite:///{}'.format((workdir / 'universe.db').resolve())
+    os.environ['ZIPLINE_ROOT'] = str((workdir / 'zipline').resolve())
+
+
+def register_bundle(config: dict) -> None:
+    import database_bundle
+    from zipline.data.bundles import register
+    from benchmarks.synthetic import synthetic_sessions
+
+    sessions = synthetic_sessions(config['years'])
+    register(BUNDLE, database_bundle.database_bundle, calendar_name='XMOS',
+             start_session=sessions[0], end_session=sessions[-1])
+
+
+def run_period(config: dict) -> (datetime, datetime):
+    # Leaves TSMomentum its 400 days of history plus the longest ranking period
+    from benchmarks.synthetic import synthetic_sessions
+
+    sessions = synthetic_sessions(config['years'])
+    return (sessions[0] + timedelta(days=800)).to_pydatetime(), sessions[-1].to_pydatetime()
+
+
+def stage_ingest(config: dict) -> dict:
+    from zipline.data.bundles import ingest
+
+    ingest(BUNDLE, os.environ, show_progress=False)
+    return {}
+
+
+def run_strategy(config: dict, strategy) -> dict:
+    from trading_calendars import get_calendar
+    from zipline import run_algorithm
+
+    start, end = run_period(config)
+
+    def initialize(context):
+        strategy.initialize(context)
+        context.strategy = strategy
+
+    perf = run_algorithm(start=start, end=end, initialize=initialize, capital_base=1000000,
+                         bundle=BUNDLE, trading_calendar=get_calendar('XMOS'), environ=os.environ)
+    return {'sessions': len(perf)}
+
+
+def stage_momentum(config: dict) -> dict:
+    from strategies.momentum import Momentum
+
+    return run_strategy(config, Momentum(ranking_period=3, holding_period=3))
+
+
+def stage_ts_momentum(config: dict) -> dict:
+    from strategies.ts_momentum import TSMomentum
+
+    return run_strategy(config, TSMomentum(ranking_period=3, holding_period=3))
+
+
+def load_panel():
+    from zipline.data.bundles import load
+    from utils.price_panel import PricePanel
+
+    return PricePanel.from_bundle(load(BUNDLE, os.environ))
+
+
+def stage_kernels(config: dict) -> dict:
+    # The per-rebalance work of both strategies, without zipline
+    from strategies.vectorized import VectorizedBacktest
+    from utils.ranking import select_batch
+    from utils.tranches import TrancheLedger
+
+    start, end = run_period(config)
+    backtest = VectorizedBacktest(load_panel(), start=start, end=end)
+    timings = {}
+
+    started = time.time()
+    formation = backtest.formation_returns([1, 3, 6, 9, 12], 1, 20)
+    timings['formation'] = time.time() - started
+
+    started = time.time()
+    for i in range(len(backtest.rebalance_days)):
+        returns = np.vstack([formation[J][2][i] for J in sorted(formation)])
+        select_batch(returns, [(10, 10), (20, 0), (0, 20)])
+    timings['ranking'] = time.time() - started
+
+    started = time.time()
+    for day in backtest.rebalance_days:
+        backtest.volatility.vol(242, int(day) + 1, 242)
+    timings['volatility'] = time.time() - started
+
+    started = time.time()
+    ledger = TrancheLedger(12)
+    random = np.random.RandomState(config['seed'])
+    for _ in range(len(backtest.rebalance_days)):
+        sids = random.choice(len(backtest.panel.tickers), 20, replace=False)
+        ledger.add(sids, 0.05)
+        ledger.net(sids)
+        ledger.net(ledger.expire())
+    timings['tranches'] = time.time() - started
+    return {'kernels': timings}
+
+
+def stage_sweep(config: dict) -> dict:
+    from main import strategy_grid
+    from strategies.vectorized import VectorizedBacktest
+
+    start, end = run_period(config)
+    grid = strategy_grid()
+    VectorizedBacktest(load_panel(), start=start, end=end).run_grid(grid)
+    return {'strategies': len(grid)}
+
+
+def measure(stage: str, config: dict) -> dict:
+    configure(config)
+    register_bundle(config)
+    started = time.time()
+    extra = globals()['stage_' + stage](config)
+    result = {
+        'seconds': time.time() - started,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+    result.update(extra)
+    return result
+
+
+def prepare(config: dict) -> None:
+    from benchmarks.synthetic import synthetic_universe, write_database
+    from utils.db import get_engine
+
+    Path(config['workdir']).mkdir(parents=True, exist_ok=True)
+    configure(config)
+    write_database(synthetic_universe(config['tickers'], config['years'], config['seed']),
+                   get_engine(os.environ['DATABASE_URL']))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def read_history(path: Path) -> list:
+    if not path.exists():
+        return []
+    with path.open() as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def regressions(history: list, entry: dict, threshold: float, window=5) -> list:
+    # Stages slower than the median of the last `window` runs of the same configuration
+    previous = [h for h in history if h['config'] == entry['config']][-window:]
+    found = []
+    for stage, result in entry['stages'].items():
+        timings = [h['stages'][stage]['seconds'] for h in previous if stage in h['stages']]
+        if timings:
+            baseline = float(np.median(timings))
+            if result['seconds'] > baseline * (1 + threshold):
+                found.append((stage, baseline, result['seconds']))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark suite on a synthetic universe')
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--years', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stages', nargs='*', default=STAGES, choices=STAGES)
+    parser.add_argument('--history', default='data/benchmark/history.jsonl')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 = 20%%')
+    args = parser.parse_args()
+
+    config = {'tickers': args.tickers, 'years': args.years, 'seed': args.seed}
+    config['workdir'] = str(Path('data/benchmark') / '{tickers}x{years}-{seed}'.format(**config))
+
+    started = time.time()
+    prepare(config)
+    print('Generated {tickers} tickers x {years} years in {:1.1f} seconds'.format(time.time() - started, **config))
+
+    stages = {}
+    for stage in [s for s in STAGES if s in args.stages]:
+        # Spawned, a forked child would count the parent's pages in its ru_maxrss
+        with get_context('spawn').Pool(processes=1) as pool:
+            stages[stage] = pool.apply(measure, (stage, config))
+        print('{:>12}: {:8.2f} s {:8.1f} MB'.format(stage, stages[stage]['seconds'], stages[stage]['peak_rss_mb']))
+
+    history_path = Path(args.history)
+    entry = {
+        'time': datetime.utcnow().isoformat(),
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'config': {k: v for k, v in config.items() if k != 'workdir'},
+        'stages': stages
+    }
+    found = regressions(read_history(history_path), entry, args.threshold)
+
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with history_path.open('a') as f:
+        f.write(json.dumps(entry, sort_keys=True) + '\n')
+
+    for stage, baseline, seconds in found:
+        print('Regression in {}: {:1.2f} s, median of previous runs {:1.2f} s'.format(stage, seconds, baseline))
+    sys.exit(1 if found else 0)
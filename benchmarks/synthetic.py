@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from utils.sessions import get_session_calendar
+
+"""
+Deterministic synthetic universe in the schema the bundle reads:
+equity_history (ticker, trade_date, open, high, low, close, volume)
+and instruments (ticker, lot). The same seed always gives the same rows.
+Some tickers list late or delist early, a few sessions are missing
+and a few trade no volume, like the real data.
+"""
+
+BENCHMARK = 'MICEX'
+
+
+def synthetic_sessions(years: float, end='2018-12-29') -> pd.DatetimeIndex:
+    return get_session_calendar('XMOS').sessions_back(pd.Timestamp(end, tz='UTC'), int(years * 252))
+
+
+def synthetic_universe(tickers=200, years=5.0, seed=42, end='2018-12-29') -> pd.DataFrame:
+    random = np.random.RandomState(seed)
+    sessions = synthetic_sessions(years, end)
+    n_sessions = len(sessions)
+    names = ['T{:04d}'.format(i) for i in range(tickers)] + [BENCHMARK]
+    n_tickers = len(names)
+
+    # Daily log returns with a per-ticker drift and volatility
+    drift = random.normal(0.0002, 0.0005, n_tickers)
+    vol = random.uniform(0.01, 0.035, n_tickers)
+    returns = drift + vol * random.standard_normal((n_sessions, n_tickers))
+    close = 100 * np.exp(np.cumsum(returns, axis=0))
+
+    listed = np.ones((n_sessions, n_tickers), dtype=bool)
+    first = np.where(random.rand(n_tickers) < 0.2, random.randint(0, n_sessions // 2, n_tickers), 0)
+    last = np.where(random.rand(n_tickers) < 0.1, random.randint(n_sessions // 2, n_sessions, n_tickers), n_sessions)
+    rows = np.arange(n_sessions)[:, None]
+    listed &= (rows >= first) & (rows < last)
+    listed &= random.rand(n_sessions, n_tickers) > 0.02
+    listed[:, -1] = True
+
+    spread = np.abs(random.normal(0, 0.01, (n_sessions, n_tickers)))
+    volume = np.floor(random.lognormal(10, 1, (n_sessions, n_tickers)))
+    volume[random.rand(n_sessions, n_tickers) < 0.01] = 0
+
+    session_index, ticker_index = np.nonzero(listed)
+    prices = close[session_index, ticker_index]
+    spreads = spread[session_index, ticker_index]
+    return pd.DataFrame({
+        'ticker': np.asarray(names)[ticker_index],
+        'trade_date': sessions.tz_convert(None)[session_index],
+        'open': prices * (1 + spreads / 2),
+        'high': prices * (1 + spreads),
+        'low': prices * (1 - spreads),
+        'close': prices,
+        'volume': volume[session_index, ticker_index]
+    }, columns=['ticker', 'trade_date', 'open', 'high', 'low', 'close', 'volume'])
+
+
+def write_database(df: pd.DataFrame, engine) -> None:
+    df.to_sql('equity_history', engine, if_exists='replace', index=False, chunksize=50000)
+    instruments = pd.DataFrame({'ticker': df['ticker'].unique(), 'lot': 1})
+    instruments.to_sql('instruments', engine, if_exists='replace', index=False)
@@ -1,31 +1,43 @@
-import functools
-from concurrent.futures import ThreadPoolExecutor
+import argparse
 import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from multiprocessing import Pool
 
 import pytz
-from trading_calendars import get_calendar
-from zipline import run_algorithm
 
 from strategies.momentum import Momentum
 from strategies.ts_momentum import TSMomentum
+from utils.price_panel import build_price_panel
+from utils.profiling import profiler, capture
+from utils.result_cache import ResultCache, bundle_fingerprint, cache_key
+
+BUNDLE = 'database_bundle2'
+
+START = datetime(2012, 1, 3, 7, 0, 0, tzinfo=pytz.timezone('Europe/Moscow'))
+END = datetime(2018, 12, 29, 7, 0, 0, tzinfo=pytz.timezone('Europe/Moscow'))
+
+PROFILE_DIR = 'data/profile'
 
 
 def run(strategy: Momentum) -> None:
+    from trading_calendars import get_calendar
+    from zipline import run_algorithm
+
     print('Running strategy {}'.format(strategy.file_name()))
-    start = datetime(2012, 1, 3, 7, 0, 0, tzinfo=pytz.timezone('Europe/Moscow'))
-    end = datetime(2018, 12, 29, 7, 0, 0, tzinfo=pytz.timezone('Europe/Moscow'))
 
     def initialize(context):
         strategy.initialize(context)
         context.strategy = strategy
 
     return run_algorithm(
-        start=start,
-        end=end,
+        start=START,
+        end=END,
         initialize=initialize,
         capital_base=1000000,
-        bundle='database_bundle2',
+        bundle=BUNDLE,
         trading_calendar=get_calendar('XMOS')
     )
 
@@ -39,12 +51,110 @@ async def run_async(strategy: Momentum):
     await ioloop.run_in_executor(pool2, analyze, res)
 
 
-if __name__ == '__main__':
-    pool = ThreadPoolExecutor(max_workers=50)
-    pool2 = ThreadPoolExecutor(max_workers=50)
-    ioloop = asyncio.get_event_loop()
+def init_worker(bundle: str) -> None:
+    # Load the bundle and its asset finder once per worker process,
+    # run_algorithm then gets the same instance for every strategy
+    from zipline.data import bundles
+
+    bundle_data = bundles.load(bundle)
+    load = bundles.load
+
+    def cached_load(name, environ=os.environ, timestamp=None):
+        if name == bundle and timestamp is None:
+            return bundle_data
+        return load(name, environ, timestamp)
+
+    bundles.load = cached_load
+
+
+def run_and_save(strategy: Momentum) -> (str, float):
+    profiler.reset()
+    started = time.time()
+    if strategy.strategy_id() == os.environ.get('STRATEGY_PROFILE_RUN'):
+        with capture(os.path.join(PROFILE_DIR, '{}.prof'.format(strategy.strategy_id()))):
+            perf = run(strategy)
+    else:
+        perf = run(strategy)
+    with profiler.timer('save'):
+        strategy.analyze(None, perf)
+    elapsed = time.time() - started
+
+    if profiler.enabled:
+        profiler.dump(os.path.join(PROFILE_DIR, '{}.json'.format(strategy.strategy_id())),
+                      strategy=strategy.strategy_id(),
+                      seconds=elapsed)
+    return strategy.file_name(), elapsed
+
+
+def run_pool(strategies: list, processes: int = None, cache: ResultCache = None, resume: bool = True) -> float:
+    """
+    Runs the strategies in a process pool. With a cache, strategies whose
+    class, parameters, dates and bundle ingestion are unchanged since a
+    previous run get their stored result instead of being simulated.
+    Without one, strategies whose output file exists are skipped unless
+    resume is off, so an interrupted sweep resumes.
+    """
+    keys = {}
+    if cache is None and resume:
+        done = [s for s in strategies if s.output_path().exists()]
+        strategies = [s for s in strategies if not s.output_path().exists()]
+        print('Skipping {} strategies with existing output'.format(len(done)))
+    elif cache is not None:
+        fingerprint = bundle_fingerprint(BUNDLE)
+        pending = []
+        for strategy in strategies:
+            key = keys[strategy.strategy_id()] = cache_key(strategy, START, END, fingerprint)
+            if not cache.get(key, strategy.output_path()):
+                pending.append(strategy)
+        print('Reusing {} cached results'.format(len(strategies) - len(pending)))
+        strategies = pending
+
+    by_name = {strategy.file_name(): strategy for strategy in strategies}
+    started = time.time()
+    busy = 0.0
+    with Pool(processes=processes or os.cpu_count(), initializer=init_worker, initargs=(BUNDLE,)) as workers:
+        # Results come back in the order the runs finish
+        for name, elapsed in workers.imap_unordered(run_and_save, strategies):
+            busy += elapsed
+            if cache is not None:
+                strategy = by_name[name]
+                cache.put(keys[strategy.strategy_id()], strategy.output_path())
+            print('Saved strategy {} in {:1.1f} seconds'.format(name, elapsed))
+
+    if cache is not None:
+        # After the run, so the limit never evicts results of this grid
+        removed = cache.evict(keep=keys.values())
+        if removed:
+            print('Evicted {} cached results from {}'.format(removed, cache.outputs))
 
-    tasks = []
+    # Summed run times over wall time: how many runs were busy at once, not a measured speedup;
+    # --executor compare times the thread runner on the same grid for that
+    wall = time.time() - started
+    print('Ran {} strategies in {:1.1f} seconds ({:1.1f} runs in parallel on average)'
+          .format(len(strategies), wall, busy / wall if wall > 0 else 0.0))
+    return wall
+
+
+def run_threads(strategies: list, workers: int = 50) -> float:
+    # The previous runner: every strategy in a thread pool driven by an asyncio loop
+    global ioloop, pool, pool2
+    started = time.time()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pool2 = ThreadPoolExecutor(max_workers=workers)
+    ioloop = asyncio.new_event_loop()
+    asyncio.set_event_loop(ioloop)
+
+    tasks = [run_async(strategy) for strategy in strategies]
+
+    ioloop.run_until_complete(asyncio.gather(*tasks))
+    ioloop.close()
+    wall = time.time() - started
+    print('Ran {} strategies in {:1.1f} seconds'.format(len(tasks), wall))
+    return wall
+
+
+def strategy_grid() -> list:
+    strategies = []
 
     for J in [1, 3, 6, 9, 12]:
         for K in [1, 3, 6, 9, 12]:
@@ -64,8 +174,65 @@ if __name__ == '__main__':
                     winners_amount=20 if b_s_strategy > 0 else 0 if b_s_strategy < 0 else 10,
                     losers_amount=20 if b_s_strategy < 0 else 0 if b_s_strategy > 0 else 10
                 )
-                tasks.append(run_async(tsmom))
-                tasks.append(run_async(csmom))
+                strategies.append(tsmom)
+                strategies.append(csmom)
 
-    ioloop.run_until_complete(asyncio.gather(*tasks))
-    ioloop.close()
+    return strategies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the momentum strategy grid')
+    parser.add_argument('--executor', choices=['process', 'thread', 'compare'], default='process',
+                        help='process pool sized to the cores, the previous thread pool runner, '
+                             'or both on the same grid without the cache, timed')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not use the result cache, only skip strategies with existing output')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='simulate every strategy, even with a cached result or existing output')
+    parser.add_argument('--cache-max-mb', type=float, default=None,
+                        help='evict the least recently used cached results past this size')
+    parser.add_argument('--price-panel', action='store_true',
+                        help='read prices from a memory-mapped panel shared by all workers')
+    parser.add_argument('--exclusions', default=None, metavar='PATH',
+                        help='data-quality mask from utils.data_quality instead of the hand-picked filter_stocks')
+    parser.add_argument('--profile', action='store_true',
+                        help='time the strategy callbacks and data access, one JSON report per run in ' + PROFILE_DIR)
+    parser.add_argument('--profile-run', default=None, metavar='STRATEGY',
+                        help='strategy id, e.g. TSMOM_L_3_3, to run under cProfile (cached runs are not simulated)')
+    args = parser.parse_args()
+    # The profiler's counters are per process, threads would mix the runs together
+    if args.executor != 'process' and (args.profile or args.profile_run):
+        parser.error('--profile and --profile-run need --executor process')
+
+    # Set in the environment so pool workers started by spawn pick them up too
+    if args.profile:
+        os.environ['STRATEGY_PROFILE'] = '1'
+        profiler.enable()
+    if args.profile_run:
+        os.environ['STRATEGY_PROFILE_RUN'] = args.profile_run
+
+    grid = strategy_grid()
+    if args.price_panel:
+        path = str(build_price_panel(BUNDLE))
+        for strategy in grid:
+            strategy.price_panel = path
+    if args.exclusions:
+        for strategy in grid:
+            strategy.exclusions = args.exclusions
+            strategy.filter_stocks = None
+
+    if args.executor == 'process':
+        cache = None
+        if not args.no_cache and not args.no_resume:
+            max_bytes = None if args.cache_max_mb is None else int(args.cache_max_mb * 2 ** 20)
+            cache = ResultCache(max_bytes=max_bytes)
+        run_pool(grid, processes=args.processes, cache=cache, resume=not args.no_resume)
+    elif args.executor == 'thread':
+        run_threads(grid)
+    else:
+        # Both simulate every strategy, neither skips cached or existing results
+        threads = run_threads(grid)
+        processes = run_pool(grid, processes=args.processes, resume=False)
+        print('Thread pool {:1.1f} seconds, process pool {:1.1f} seconds: {:1.2f}x faster'
+              .format(threads, processes, threads / processes if processes > 0 else 0.0))
@@ -0,0 +1,197 @@
+import argparse
+import re
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.results_store import ResultsStore
+
+APPROX_BDAYS_PER_YEAR = 252
+
+"""
+Performance metrics for all strategies at once. Every function takes a
+dates x strategies returns matrix (NaN where a strategy has no data)
+and returns one value per strategy.
+"""
+
+
+def cum_returns(returns: np.ndarray) -> np.ndarray:
+    return np.nancumprod(1 + returns, axis=0) - 1
+
+
+def annual_return(returns: np.ndarray) -> np.ndarray:
+    years = np.sum(~np.isnan(returns), axis=0) / APPROX_BDAYS_PER_YEAR
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nanprod(1 + returns, axis=0) ** (1 / years) - 1
+
+
+def annual_volatility(returns: np.ndarray) -> np.ndarray:
+    return np.nanstd(returns, axis=0, ddof=1) * np.sqrt(APPROX_BDAYS_PER_YEAR)
+
+
+def sharpe_ratio(returns: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nanmean(returns, axis=0) / np.nanstd(returns, axis=0, ddof=1) * np.sqrt(APPROX_BDAYS_PER_YEAR)
+
+
+def sortino_ratio(returns: np.ndarray) -> np.ndarray:
+    downside = np.sqrt(np.nanmean(np.minimum(returns, 0) ** 2, axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nanmean(returns, axis=0) / downside * np.sqrt(APPROX_BDAYS_PER_YEAR)
+
+
+def max_drawdown(returns: np.ndarray) -> np.ndarray:
+    wealth = np.nancumprod(1 + returns, axis=0)
+    peaks = np.maximum.accumulate(wealth, axis=0)
+    return np.min(wealth / peaks - 1, axis=0)
+
+
+def calmar_ratio(returns: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return annual_return(returns) / np.abs(max_drawdown(returns))
+
+
+def alpha_beta(returns: np.ndarray, benchmark: np.ndarray) -> (np.ndarray, np.ndarray):
+    # Regression of daily returns on the benchmark, over the days both are known
+    benchmark = np.broadcast_to(benchmark[:, None], returns.shape)
+    known = ~np.isnan(returns) & ~np.isnan(benchmark)
+    r = np.where(known, returns, np.nan)
+    b = np.where(known, benchmark, np.nan)
+
+    r_dev = r - np.nanmean(r, axis=0)
+    b_dev = b - np.nanmean(b, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = np.nansum(r_dev * b_dev, axis=0) / np.nansum(b_dev ** 2, axis=0)
+    alpha = (1 + np.nanmean(r - beta * b, axis=0)) ** APPROX_BDAYS_PER_YEAR - 1
+    return alpha, beta
+
+
+def turnover(transactions: pd.DataFrame, portfolio_value: pd.Series) -> float:
+    # Mean daily traded value relative to the portfolio value
+    if transactions.empty:
+        return 0.0
+    traded = (transactions['amount'].abs() * transactions['price']).groupby(transactions['date']).sum()
+    traded = traded.reindex(portfolio_value.index).fillna(0)
+    return (traded / portfolio_value).mean()
+
+
+def summary(returns: pd.DataFrame, benchmark: pd.Series = None) -> pd.DataFrame:
+    values = returns.values
+    table = pd.DataFrame({
+        'total_return': cum_returns(values)[-1],
+        'annual_return': annual_return(values),
+        'annual_volatility': annual_volatility(values),
+        'sharpe_ratio': sharpe_ratio(values),
+        'sortino_ratio': sortino_ratio(values),
+        'max_drawdown': max_drawdown(values),
+        'calmar_ratio': calmar_ratio(values),
+        'hit_rate': np.nanmean(np.where(np.isnan(values), np.nan, values > 0), axis=0)
+    }, index=returns.columns)
+
+    if benchmark is not None:
+        table['alpha'], table['beta'] = alpha_beta(values, benchmark.reindex(returns.index).values)
+
+    return table
+
+
+def parse_strategy_id(strategy_id: str) -> dict:
+    # CSMOM_L_S_3_6 -> group CSMOM, type L_S, ranking period 3, holding period 6
+    match = re.match(r'^([A-Z]+)_(L_S|L|S)_(\d+)_(\d+)$', strategy_id)
+    if match is None:
+        return {}
+    group, b_s_type, ranking_period, holding_period = match.groups()
+    return {'group': group, 'type': b_s_type, 'J': int(ranking_period), 'K': int(holding_period)}
+
+
+def benchmark_returns(store: ResultsStore, group: str, strategy_id: str) -> pd.Series:
+    # Daily MICEX returns from the benchmark's cumulative return in the perf frame
+    cumulative = store.read(group, strategy_id, columns=['benchmark_period_return'])['benchmark_period_return']
+    wealth = 1 + cumulative
+    return wealth / wealth.shift(1).fillna(1) - 1
+
+
+def plot(args) -> str:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    strategy_id, returns, outdir = args
+    wealth = (1 + returns.fillna(0)).cumprod()
+    drawdown = wealth / wealth.cummax() - 1
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(10, 6), gridspec_kw={'height_ratios': [3, 1]})
+    (wealth - 1).plot(ax=ax1, title=strategy_id)
+    ax1.set_ylabel('Cumulative return')
+    drawdown.plot(ax=ax2, color='red')
+    ax2.set_ylabel('Drawdown')
+
+    path = str(Path(outdir) / '{}.png'.format(strategy_id))
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def load_returns(store: ResultsStore, groups: list) -> dict:
+    # Read every returns column once, shared by the summary and the plots
+    loaded = {}
+    for group in groups:
+        returns = store.returns(group=group)
+        if not returns.empty:
+            loaded[group] = returns
+    return loaded
+
+
+def analyze(store: ResultsStore, returns_by_group: dict, with_turnover=True) -> pd.DataFrame:
+    tables = []
+    for group in sorted(returns_by_group):
+        returns = returns_by_group[group]
+        # Vectorized, sweep and walk-forward results store only returns, zipline runs the whole perf frame
+        columns = store.read(group, returns.columns[0]).columns
+        benchmark = None
+        if 'benchmark_period_return' in columns:
+            benchmark = benchmark_returns(store, group, returns.columns[0])
+        table = summary(returns, benchmark)
+
+        if with_turnover and 'portfolio_value' in columns:
+            portfolio_value = store.daily('portfolio_value', group=group)
+            table['turnover'] = [turnover(store.transactions(group, strategy_id), portfolio_value[strategy_id])
+                                 for strategy_id in table.index]
+
+        details = pd.DataFrame([parse_strategy_id(s) for s in table.index], index=table.index)
+        tables.append(details.join(table))
+
+    return pd.concat(tables) if tables else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Metrics for every stored strategy result')
+    parser.add_argument('--groups', nargs='*', default=['CSMOM', 'TSMOM'])
+    parser.add_argument('--out', default='data/out/metrics')
+    parser.add_argument('--plots', action='store_true', help='also write a cumulative return plot per strategy')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--no-turnover', action='store_true', help='skip reading the transactions tables')
+    args = parser.parse_args()
+
+    start = time.time()
+    store = ResultsStore()
+    outdir = Path(args.out)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    returns_by_group = load_returns(store, args.groups)
+    table = analyze(store, returns_by_group, with_turnover=not args.no_turnover)
+    table.to_csv(str(outdir / 'summary.csv'))
+    print(table.sort_values('sharpe_ratio', ascending=False).to_string())
+
+    if args.plots:
+        plotdir = outdir / 'plots'
+        plotdir.mkdir(parents=True, exist_ok=True)
+        jobs = []
+        for returns in returns_by_group.values():
+            jobs.extend((strategy_id, returns[strategy_id], str(plotdir)) for strategy_id in returns.columns)
+        with Pool(processes=args.processes) as workers:
+            workers.map(plot, jobs)
+
+    print('Analyzed {} strategies in {:1.1f} seconds'.format(len(table), time.time() - start))
@@ -0,0 +1,193 @@
+import argparse
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from metrics import APPROX_BDAYS_PER_YEAR, load_returns, parse_strategy_id
+from utils.results_store import ResultsStore
+
+"""
+Which strategies beat zero after data snooping. The daily returns of all
+stored results are resampled as one dates x strategies matrix, so the
+cross-correlation of the strategies is kept and the max statistics
+behind the adjusted p-values are valid for the whole family:
+
+- stationary block bootstrap (Politis & Romano): percentile CIs of the
+  mean daily return and Sharpe ratio, White's Reality Check and Hansen's
+  SPA p-values for a positive mean;
+- sign-flip permutation test, signs drawn per block of days: p-values for
+  mean and Sharpe, single and adjusted over all strategies (max-T).
+
+A resample reduces to weights over the days (bootstrap counts or signs),
+so a batch of resamples is two matrix products with the returns. Batches
+are drawn from RandomState([seed, batch]) and spread over a process pool;
+the result does not depend on the number of processes.
+"""
+
+# Returns matrix of the pool workers, set once per process
+_returns = None
+
+
+def init_worker(returns: np.ndarray) -> None:
+    global _returns
+    _returns = returns
+
+
+def stationary_indices(random: np.random.RandomState, resamples: int, n_days: int, block: float) -> np.ndarray:
+    # A new block starts at a random day with probability 1 / block, otherwise the next day follows
+    starts = random.randint(0, n_days, (resamples, n_days))
+    new_block = random.rand(resamples, n_days) < 1.0 / block
+    new_block[:, 0] = True
+    days = np.arange(n_days)
+    block_start = np.maximum.accumulate(np.where(new_block, days, 0), axis=1)
+    rows = np.arange(resamples)[:, None]
+    return (starts[rows, block_start] + days - block_start) % n_days
+
+
+def bootstrap_weights(random: np.random.RandomState, resamples: int, n_days: int, block: float) -> np.ndarray:
+    # How often each day is drawn in each resample
+    indices = stationary_indices(random, resamples, n_days, block)
+    offsets = (np.arange(resamples) * n_days)[:, None]
+    counts = np.bincount((indices + offsets).ravel(), minlength=resamples * n_days)
+    return counts.reshape(resamples, n_days).astype(np.float64)
+
+
+def sign_flip_weights(random: np.random.RandomState, resamples: int, n_days: int, block: int) -> np.ndarray:
+    blocks = -(-n_days // block)
+    signs = random.randint(0, 2, (resamples, blocks)) * 2.0 - 1.0
+    return np.repeat(signs, block, axis=1)[:, :n_days]
+
+
+def moments(weights: np.ndarray, returns: np.ndarray) -> (np.ndarray, np.ndarray):
+    # Mean and annualized Sharpe ratio of every (resample, strategy) pair
+    n_days = returns.shape[0]
+    mean = weights.dot(returns) / n_days
+    square = np.abs(weights).dot(returns ** 2)
+    variance = np.maximum(square - n_days * mean ** 2, 0.0) / (n_days - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = mean / np.sqrt(variance) * np.sqrt(APPROX_BDAYS_PER_YEAR)
+    return mean, sharpe
+
+
+def resample(task: tuple) -> (np.ndarray, np.ndarray):
+    kind, seed, batch, resamples, block = task
+    random = np.random.RandomState([seed, batch])
+    n_days = _returns.shape[0]
+    if kind == 'bootstrap':
+        weights = bootstrap_weights(random, resamples, n_days, block)
+    else:
+        weights = sign_flip_weights(random, resamples, n_days, int(block))
+    mean, sharpe = moments(weights, _returns)
+    # Single precision halves the memory of thousands of resamples x strategies
+    return mean.astype(np.float32), sharpe.astype(np.float32)
+
+
+def run_resamples(pool: Pool, kind: str, resamples: int, seed: int, block: float, batch_size: int):
+    batches = [(kind, seed, i, min(batch_size, resamples - start), block)
+               for i, start in enumerate(range(0, resamples, batch_size))]
+    results = pool.map(resample, batches)
+    return np.vstack([mean for mean, _ in results]), np.vstack([sharpe for _, sharpe in results])
+
+
+def exceedance(statistics: np.ndarray, observed: np.ndarray) -> np.ndarray:
+    # Permutation p-value of every observed value: (1 + resamples at least as large) / (1 + resamples)
+    statistics = np.sort(statistics)
+    larger = len(statistics) - np.searchsorted(statistics, observed, 'left')
+    return (1.0 + larger) / (1.0 + len(statistics))
+
+
+def reality_check(mean: np.ndarray, boot_mean: np.ndarray, n_days: int) -> np.ndarray:
+    # White (2000): max over strategies of the recentred bootstrap means against each observed mean
+    boot_max = np.nanmax(np.sqrt(n_days) * (boot_mean - mean), axis=1)
+    return np.array([np.mean(boot_max >= np.sqrt(n_days) * m) for m in mean])
+
+
+def spa(mean: np.ndarray, boot_mean: np.ndarray, n_days: int) -> np.ndarray:
+    """
+    Hansen (2005), consistent version: studentized by the bootstrap standard
+    error, and strategies far below zero are not recentred, so hopeless
+    strategies do not inflate the p-values of the others.
+    """
+    omega = np.nanstd(np.sqrt(n_days) * boot_mean, axis=0)
+    threshold = -np.sqrt(omega ** 2 / n_days * 2 * np.log(np.log(n_days)))
+    recentre = np.where(mean >= threshold, mean, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        boot_t = np.sqrt(n_days) * (boot_mean - recentre) / omega
+        observed = np.sqrt(n_days) * mean / omega
+    boot_max = np.maximum(np.nanmax(boot_t, axis=1), 0.0)
+    return np.array([np.mean(boot_max >= max(t, 0.0)) for t in observed])
+
+
+def significance(returns: pd.DataFrame, resamples=5000, block=20.0, alpha=0.05, seed=42,
+                 batch_size=250, processes=None) -> pd.DataFrame:
+    """
+    One row per strategy: mean daily return and Sharpe ratio with bootstrap
+    CIs, bootstrap, sign-flip and family-wise adjusted p-values of a positive mean.
+    Days a strategy has no result count as zero returns.
+    """
+    returns = returns.dropna(how='all')
+    values = returns.fillna(0.0).values
+    n_days = values.shape[0]
+    mean, sharpe = moments(np.ones((1, n_days)), values)
+    mean, sharpe = mean[0], sharpe[0]
+
+    with Pool(processes=processes, initializer=init_worker, initargs=(values,)) as pool:
+        boot_mean, boot_sharpe = run_resamples(pool, 'bootstrap', resamples, seed, block, batch_size)
+        flip_mean, flip_sharpe = run_resamples(pool, 'sign_flip', resamples, seed + 1, block, batch_size)
+
+    quantiles = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    mean_low, mean_high = np.nanpercentile(boot_mean, quantiles, axis=0)
+    sharpe_low, sharpe_high = np.nanpercentile(boot_sharpe, quantiles, axis=0)
+    flip_max = np.nanmax(flip_sharpe, axis=1)
+
+    return pd.DataFrame({
+        'mean_return': mean,
+        'mean_return_low': mean_low,
+        'mean_return_high': mean_high,
+        'sharpe_ratio': sharpe,
+        'sharpe_ratio_low': sharpe_low,
+        'sharpe_ratio_high': sharpe_high,
+        'p_bootstrap': np.mean(boot_mean - mean >= mean, axis=0),
+        'p_sign_flip_mean': np.array([exceedance(flip_mean[:, k], mean[k]) for k in range(len(mean))]),
+        'p_sign_flip_sharpe': np.array([exceedance(flip_sharpe[:, k], sharpe[k]) for k in range(len(sharpe))]),
+        'p_sign_flip_adjusted': exceedance(flip_max, sharpe),
+        'p_reality_check': reality_check(mean, boot_mean, n_days),
+        'p_spa': spa(mean, boot_mean, n_days)
+    }, index=returns.columns, columns=['mean_return', 'mean_return_low', 'mean_return_high',
+                                       'sharpe_ratio', 'sharpe_ratio_low', 'sharpe_ratio_high',
+                                       'p_bootstrap', 'p_sign_flip_mean', 'p_sign_flip_sharpe',
+                                       'p_sign_flip_adjusted', 'p_reality_check', 'p_spa'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bootstrap and permutation significance of every stored strategy')
+    parser.add_argument('--groups', nargs='*', default=['CSMOM', 'TSMOM'])
+    parser.add_argument('--out', default='data/out/significance')
+    parser.add_argument('--resamples', type=int, default=5000)
+    parser.add_argument('--block', type=float, default=20.0, help='mean block length in days')
+    parser.add_argument('--alpha', type=float, default=0.05, help='CIs cover 1 - alpha')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=250, help='resamples drawn per pool task')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.time()
+    returns_by_group = load_returns(ResultsStore(), args.groups)
+    returns = pd.concat(returns_by_group, axis=1)
+    returns.columns.names = ['group', 'strategy']
+
+    table = significance(returns, args.resamples, args.block, args.alpha, args.seed, args.batch_size, args.processes)
+    details = pd.DataFrame([parse_strategy_id(s) for _, s in table.index], index=table.index)
+    table = details.drop('group', axis=1, errors='ignore').join(table)
+
+    outdir = Path(args.out)
+    outdir.mkdir(parents=True, exist_ok=True)
+    table.to_csv(str(outdir / 'significance.csv'))
+    print(table.sort_values('p_spa').to_string())
+    print('Best strategy: Reality Check p = {:1.3f}, SPA p = {:1.3f}'.format(table['p_reality_check'].min(),
+                                                                            table['p_spa'].min()))
+    print('Tested {} strategies with {} resamples in {:1.1f} seconds'.format(len(table), args.resamples,
+                                                                             time.time() - start))
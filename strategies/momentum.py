@@ -2,22 +2,27 @@ import time
 from datetime import timedelta, datetime
 from pathlib import Path
 
-import empyrical
-import pytz
-from pyfolio.utils import extract_rets_pos_txn_from_zipline
-from trading_calendars import get_calendar
-from zipline import run_algorithm
-from zipline.api import symbol, order_target_percent, schedule_function, set_commission, set_slippage, set_benchmark
-from zipline.finance.slippage import FixedSlippage
-from zipline.utils.events import date_rules, time_rules
+import numpy as np
+import pandas as pd
 
+from utils.data_quality import open_exclusions
 from utils.get_available_assets import get_available_assets
+from utils.price_panel import open_price_panel
+from utils.profiling import profiled
+from utils.ranking import formation_returns, select
+from utils.results_store import ResultsStore
+from utils.tranches import TrancheLedger
 from utils.trading_utils import sessions_in_range, cumulative_returns
-import pandas as pd
-import pyfolio as pf
+
+"""
+zipline is imported where it is used: the vectorized engine, the
+results tools and pool parents only need the strategy definitions.
+"""
 
 
 class Momentum:
+    results_group = 'CSMOM'
+
     def __init__(self,
                  momentum_gap=1,
                  ranking_period=3,
@@ -25,8 +30,11 @@ class Momentum:
                  losers_amount=10,
                  winners_amount=10,
                  filter_stocks=None,
-                 commission=None) -> None:
-        if filter_stocks is None:
+                 commission=None,
+                 price_panel=None,
+                 exclusions=None) -> None:
+        # The hand-picked list is only the default without a data-quality mask
+        if filter_stocks is None and exclusions is None:
             filter_stocks = ['FIVE', 'KZOSP', 'NSVZ', 'RKKE', 'TRNFP',
                              'TCSG', 'ENPG', 'KLSB', 'UNAC', 'TGKN',
                              'KRKNP', 'KROT', 'MSST', 'PRFN', 'DASB',
@@ -38,7 +46,11 @@ class Momentum:
         self.winners_amount = winners_amount
         self.filter_stocks = filter_stocks
         self.commission = commission
+        self.price_panel = price_panel
+        self.exclusions = exclusions
         self.start = None
+        self._assets = {}
+        self._by_sid = {}
 
     def __str__(self):
         return """
@@ -51,8 +63,12 @@ class Momentum:
                 """.format(self.ranking_period, self.holding_period, self.losers_amount, self.winners_amount)
 
     def initialize(self, context):
+        from zipline.api import symbol, schedule_function, set_commission, set_slippage, set_benchmark
+        from zipline.finance.slippage import FixedSlippage
+        from zipline.utils.events import date_rules, time_rules
+
         set_benchmark(symbol('MICEX'))
-        context.portfolios = list()
+        context.tranches = TrancheLedger(self.holding_period)
         schedule_function(self.rebalance, date_rule=date_rules.month_start(), time_rule=time_rules.market_close())
         schedule_function(self.sell_stocks, date_rule=date_rules.month_end(1), time_rule=time_rules.market_close())
         if self.commission:
@@ -78,6 +94,7 @@ class Momentum:
         # Remember today's portfolio value for next month's calculation
         context.last_month = context.portfolio.portfolio_value
 
+    @profiled('rebalance')
     def rebalance(self, context, data):
         # Momentum.output_progress(context)
 
@@ -91,85 +108,106 @@ class Momentum:
         last_date = sessions[-1]
 
         # get available stocks
-        available_stocks = set(get_available_assets(first_date=first_date, last_date=last_date))
-        if self.filter_stocks is not None:
-            available_stocks = available_stocks.difference(self.filter_stocks)
+        available_stocks = self.tradable(get_available_assets(first_date=first_date, last_date=last_date), today)
         # get symbol info
-        symbols = [symbol(s) for s in available_stocks]
+        symbols = [self.asset(s) for s in available_stocks]
         # get historic data
-        history = data.history(symbols, "close", len(sessions_in_range(first_date, today)), "1d") \
+        history = self.price_history(data, symbols, len(sessions_in_range(first_date, today)), today) \
             .reindex(index=sessions) \
             .dropna(axis=1)
-        # get returns
-        returns = history.reindex(sessions).dropna().apply(empyrical.simple_returns)
-        cum_rets = empyrical.cum_returns(returns)
-        returns = cum_rets.iloc[-1, :] \
-            .dropna() \
-            .sort_values()
-        # get losers and winners
-        if self.losers_amount > 0:
-            losers = returns.loc[returns < 0][:self.losers_amount]
-        else:
-            losers = pd.Series()
-
-        if self.winners_amount > 0:
-            winners = returns.loc[returns > 0.01][-self.winners_amount:]
+        # get losers and winners from the first and last prices of the formation window
+        prices = history.values
+        if len(prices) > 0:
+            returns = formation_returns(prices[0], prices[-1])
         else:
-            winners = pd.Series()
-
-        new_portfolio = {
-            'stocks': losers.append(winners),
-            'holding_period': 1
-        }
-
-        context.portfolios.append(new_portfolio)
-
-        if self.losers_amount > 0:
-            for loser in losers.items():
-                if data.can_trade(loser[0]):
-                    order_target_percent(loser[0], -1 / self.losers_amount / self.holding_period)
-
-        if self.winners_amount > 0:
-            for winner in winners.items():
-                if data.can_trade(winner[0]):
-                    order_target_percent(winner[0], 1 / self.winners_amount / self.holding_period)
-
+            returns = np.array([])
+        losers, winners = select(returns, self.losers_amount, self.winners_amount)
+
+        # One tranche per rebalance; names held by older tranches get their net target
+        weights = np.r_[np.full(len(losers), -1 / max(self.losers_amount, 1) / self.holding_period),
+                        np.full(len(winners), 1 / max(self.winners_amount, 1) / self.holding_period)]
+        sids = np.array([history.columns[c].sid for c in np.r_[losers, winners]], dtype=np.int64)
+        context.tranches.add(sids, weights)
+
+        self.order_targets(data, sids, context.tranches.net(sids))
+
+    def asset(self, ticker: str):
+        # Every ticker maps to a single sid in the bundle, so the lookup is done once per run
+        asset = self._assets.get(ticker)
+        if asset is None:
+            from zipline.api import symbol
+
+            asset = self._assets[ticker] = symbol(ticker)
+            self._by_sid[asset.sid] = asset
+        return asset
+
+    @profiled('orders')
+    def order_targets(self, data, sids, targets) -> None:
+        # One order per security, to its net target over all tranches
+        from zipline.api import order_target_percent
+
+        for sid, target in zip(sids, targets):
+            security = self._by_sid[sid]
+            if data.can_trade(security):
+                order_target_percent(security, target)
+
+    @profiled('tradable')
+    def tradable(self, tickers, today) -> np.ndarray:
+        # Drops filter_stocks and the tickers the data-quality mask excludes today
+        tickers = np.asarray(tickers)
+        if self.filter_stocks is not None:
+            tickers = tickers[~np.in1d(tickers, self.filter_stocks)]
+        if self.exclusions is not None:
+            tickers = tickers[~open_exclusions(self.exclusions).mask(tickers, today)]
+        return tickers
+
+    @profiled('price_history')
+    def price_history(self, data, assets, bar_count, today):
+        # Daily closes from the shared price panel when one is set, otherwise from zipline
+        if self.price_panel is None:
+            return data.history(assets, "close", bar_count, "1d")
+        return open_price_panel(self.price_panel).history(assets, 'adj_close', bar_count, today)
+
+    @profiled('sell_stocks')
     def sell_stocks(self, context, data):
-        i = 0
-        for port in context.portfolios:
-            if port['holding_period'] == self.holding_period:
-                for security in context.portfolios.pop(i)['stocks'].items():
-                    if data.can_trade(security[0]):
-                        order_target_percent(security[0], 0)
-            else:
-                port['holding_period'] += 1
-            i += 1
+        # Names of the expired tranche go to what the remaining tranches still hold
+        sids = context.tranches.expire()
+        self.order_targets(data, sids, context.tranches.net(sids))
 
     def analyze(self, context, perf):
+        # import pyfolio as pf
+        # from pyfolio.utils import extract_rets_pos_txn_from_zipline
         # returns, positions, transactions = extract_rets_pos_txn_from_zipline(perf)
         # pf.create_full_tear_sheet(returns=returns,
         #                           positions=positions,
         #                           transactions=transactions)
-        self.to_pickle(perf)
+        self.save(perf)
         print('Finnished strategy {} at {:1.1f} seconds'.format(self.file_name(), time.time() - self.start))
 
-    def to_pickle(self, perf):
-        outname = self.file_name()
-        outdir = Path('data/out/CSMOM')
-        outdir.mkdir(parents=True, exist_ok=True)
-        perf.to_pickle(outdir / outname)
+    def save(self, perf):
+        ResultsStore().write(self.results_group, self.strategy_id(), perf)
+
+    def output_path(self) -> Path:
+        return ResultsStore().path(self.results_group, self.strategy_id())
 
     def file_name(self) -> str:
+        return self.output_path().name
+
+    def strategy_id(self) -> str:
         if self.winners_amount > self.losers_amount:
             b_s_type = 'L'
         elif self.losers_amount > self.winners_amount:
             b_s_type = 'S'
         else:
             b_s_type = 'L_S'
-        return 'CSMOM_{}_{}_{}.pickle'.format(b_s_type, self.ranking_period, self.holding_period)
+        return 'CSMOM_{}_{}_{}'.format(b_s_type, self.ranking_period, self.holding_period)
 
 
 if __name__ == "__main__":
+    import pytz
+    from trading_calendars import get_calendar
+    from zipline import run_algorithm
+
     def initialize(context):
         strategy = Momentum(ranking_period=3,
                             holding_period=3,
@@ -1,21 +1,20 @@
 from datetime import timedelta, datetime
-from pathlib import Path
 
-import empyrical
 import numpy as np
 import pandas as pd
-import pytz
 from pandas import DataFrame
-from trading_calendars import get_calendar
-from zipline import run_algorithm
-from zipline.api import symbol, order_target_percent
 
 from strategies.momentum import Momentum
 from utils.get_available_assets import get_available_assets
-from utils.trading_utils import sessions_in_range, cumulative_returns, volatility
+from utils.index_membership import open_membership
+from utils.price_panel import open_price_panel
+from utils.profiling import profiled
+from utils.trading_utils import sessions_in_range, cumulative_returns
+from utils.volatility import RollingVolatility, EwmaVolatility, inverse_vol_weights, panel_volatility
 
 
 class TSMomentum(Momentum):
+    results_group = 'TSMOM'
     counter = 0
     filter_members = None
 
@@ -28,15 +27,20 @@ class TSMomentum(Momentum):
                  vola_window=242,
                  filter_file=None,
                  commission=None,
-                 buy_sell_strategy=0) -> None:
+                 buy_sell_strategy=0,
+                 price_panel=None,
+                 vol_halflife=None,
+                 exclusions=None) -> None:
         super().__init__(momentum_gap=momentum_gap, ranking_period=ranking_period, holding_period=holding_period,
-                         filter_stocks=filter_stocks, commission=commission)
+                         filter_stocks=filter_stocks, commission=commission, price_panel=price_panel,
+                         exclusions=exclusions)
         self.vol_scale = vol_scale
         self.vola_window = vola_window
-        self.all_assets = get_available_assets()
+        self.vol_halflife = vol_halflife
         self.buy_sell_strategy = buy_sell_strategy
+        self.filter_file = filter_file
         if filter_file is not None:
-            self.filter_members = pd.read_csv(filter_file, parse_dates=['date'], index_col='date')
+            self.filter_members = open_membership(filter_file)
 
     def __str__(self):
         return """
@@ -50,15 +54,15 @@ class TSMomentum(Momentum):
                            self.vola_window,
                            self.vol_scale)
 
+    @profiled('rebalance')
     def rebalance(self, context, data):
         # Momentum.output_progress(context)
         # get historic data
 
-        def vol(ts):
-            logreturns = np.log(ts / ts.shift(1))
-            return np.sqrt(self.vola_window * logreturns.var())
-
         if self.counter == 0:
+            import empyrical
+            from zipline.api import order_target_percent
+
             first_date, last_date, sessions, history = self.history(context, data)
             returns = history.reindex(sessions).dropna().apply(empyrical.simple_returns)
             cum_rets = empyrical.cum_returns(returns)
@@ -71,11 +75,8 @@ class TSMomentum(Momentum):
                 returns = returns.where(returns > 0)
             returns = returns.dropna()
             # calculate inverse volatility to scale
-            vol = history.apply(vol, axis=0)
-            vol = vol.where(vol != 0).dropna()
-            inverse_vol = self.vol_scale / vol
-            vol_sum = inverse_vol.sum()
-            weights = (inverse_vol / vol_sum).fillna(0)
+            vol = self.volatility(history, context.get_datetime())
+            weights = pd.Series(inverse_vol_weights(vol, self.vol_scale), index=history.columns)
             weights = weights.reindex(index=returns.index).fillna(0)
 
             for security, weight in weights.items():
@@ -84,7 +85,40 @@ class TSMomentum(Momentum):
 
         self.counter += 1
 
+    @profiled('volatility')
+    def volatility(self, history: DataFrame, today: datetime) -> np.ndarray:
+        """
+        Annualized volatility of daily log returns over the history window for
+        every column of history. With a price panel the estimator is built once
+        over the whole panel and each rebalance only reads it; otherwise it runs
+        over the fetched window, vectorized across tickers. The EWMA variant
+        (vol_halflife) weighs all the history it is given.
+        """
+        if len(history.columns) == 0:
+            return np.array([])
+
+        if self.price_panel is None:
+            if self.vol_halflife is None:
+                estimator = RollingVolatility.from_prices(history.values)
+            else:
+                estimator = EwmaVolatility.from_prices(history.values, self.vol_halflife)
+            return estimator.vol(len(history), annualization=self.vola_window)
+
+        panel = open_price_panel(self.price_panel)
+        estimator = panel_volatility(self.price_panel, self.vol_halflife)
+        # Symbols missing from the panel get NaN, so they drop out of the inverse-vol weights
+        columns = np.array([panel.columns.get(asset.symbol, -1) for asset in history.columns])
+        known = columns >= 0
+        stop = panel.rows(today, 0)[1]
+        vol = np.full(len(columns), np.nan)
+        if known.any():
+            vol[known] = estimator.vol(len(history), stop, self.vola_window, columns[known])
+        return vol
+
+    @profiled('sell_stocks')
     def sell_stocks(self, context, data):
+        from zipline.api import order_target_percent
+
         if self.counter == self.holding_period:
             self.counter = 0
 
@@ -93,6 +127,7 @@ class TSMomentum(Momentum):
                 if data.can_trade(security):
                     order_target_percent(security, 0)
 
+    @profiled('history')
     def history(self, context, data) -> (datetime, datetime, DataFrame):
         today = context.get_datetime()
 
@@ -105,52 +140,43 @@ class TSMomentum(Momentum):
         last_date = sessions[-1]
 
         # get available stocks
-        available_stocks = set(get_available_assets(first_date=first_date, last_date=last_date))
-        available_stocks = available_stocks.difference(self.filter_stocks)
+        available_stocks = set(self.tradable(get_available_assets(first_date=first_date, last_date=last_date), today))
 
         if self.filter_members is not None:
-            all_prior = self.filter_members.loc[self.filter_members.index < last_date]
-            if all_prior.empty:
-                latest_day = self.filter_members.iloc[0, 0]
-            else:
-                latest_day = all_prior.iloc[-1, 0]
-            list_of_tickers = latest_day.split(';')
-            list_of_tickers = set(self.all_assets).intersection(list_of_tickers)
-            if context.portfolio.positions:
-                list_of_symbols = [symbol(s) for s in list_of_tickers]
-                diff = [k for k in context.portfolio.positions.keys() if k not in list_of_symbols]
-
-                for security in diff:
-                    if data.can_trade(security):
+            from zipline.api import order_target_percent
+
+            held = list(context.portfolio.positions)
+            if held:
+                members = self.filter_members.contains([security.symbol for security in held], last_date)
+                for security, member in zip(held, members):
+                    if not member and data.can_trade(security):
                         order_target_percent(security, 0)
-            available_stocks = available_stocks.intersection(list_of_tickers)
+            available_stocks = available_stocks.intersection(self.filter_members.members(last_date))
         # get symbol info
-        symbols = [symbol(s) for s in available_stocks]
+        symbols = [self.asset(s) for s in available_stocks]
         history_sessions = sessions_in_range(today - timedelta(days=400), today)
         # get historic data
-        return first_date, last_date, sessions, data.history(symbols,
-                                                             "close",
-                                                             len(history_sessions),
-                                                             "1d") \
+        return first_date, last_date, sessions, self.price_history(data,
+                                                                   symbols,
+                                                                   len(history_sessions),
+                                                                   today) \
             .dropna(axis=1)
 
-    def file_name(self) -> str:
+    def strategy_id(self) -> str:
         if self.buy_sell_strategy > 0:
             b_s_type = 'L'
         elif self.buy_sell_strategy < 0:
             b_s_type = 'S'
         else:
             b_s_type = 'L_S'
-        return 'TSMOM_{}_{}_{}.pickle'.format(b_s_type, self.ranking_period, self.holding_period)
-
-    def to_pickle(self, perf):
-        outname = self.file_name()
-        outdir = Path('data/out/TSMOM')
-        outdir.mkdir(parents=True, exist_ok=True)
-        perf.to_pickle(outdir / outname)
+        return 'TSMOM_{}_{}_{}'.format(b_s_type, self.ranking_period, self.holding_period)
 
 
 if __name__ == "__main__":
+    import pytz
+    from trading_calendars import get_calendar
+    from zipline import run_algorithm
+
     def initialize(context):
         strategy = TSMomentum(ranking_period=9,
                               holding_period=9,
@@ -0,0 +1,465 @@
+import argparse
+import copy
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from strategies.momentum import Momentum
+from strategies.ts_momentum import TSMomentum
+from utils.data_quality import open_exclusions
+from utils.price_panel import PricePanel, build_price_panel, open_price_panel
+from utils.ranking import select_batch
+from utils.results_store import ResultsStore
+from utils.tranches import TrancheLedger
+from utils.volatility import RollingVolatility, EwmaVolatility, inverse_vol_weights
+
+DAY = 24 * 60 * 60 * 10 ** 9
+
+# Lookback of TSMomentum.history in calendar days
+HISTORY_DAYS = 400
+
+REBALANCE = 0
+SELL = 1
+
+
+class VectorizedBacktest:
+    """
+    Replays Momentum and TSMomentum on a dates x tickers price panel.
+
+    The rebalance logic of both strategies is evaluated for all
+    rebalance dates at once with array operations; only the order
+    book is stepped day by day. Orders placed at a session close
+    fill at the next session close, as in zipline's daily mode
+    with FixedSlippage(spread=0), and pay a per-share commission
+    (zipline's default PerShare cost). Signals use adjusted closes,
+    positions are valued at raw closes without corporate actions.
+    """
+
+    def __init__(self,
+                 panel: PricePanel,
+                 start=datetime(2012, 1, 3),
+                 end=datetime(2018, 12, 29),
+                 capital_base=1000000,
+                 commission_per_share=0.001) -> None:
+        self.panel = panel
+        self.capital_base = capital_base
+        self.commission_per_share = commission_per_share
+
+        self.ns = panel.ns
+        close = np.asarray(panel.adj_close)
+        self.close = close
+        # Positions are valued at the last known price
+        self.prices = pd.DataFrame(np.asarray(panel.close)).fillna(method='ffill').fillna(0.0).values
+
+        # Prefix sums of missing prices and log returns, the estimator TSMomentum uses
+        self.volatility = RollingVolatility.from_prices(close)
+        self.missing = self.volatility.missing
+        self._ewma = {}
+        self._excluded = {}
+
+        # Positions are closed on the auto close date, the day after the last trade
+        auto_close = np.searchsorted(self.ns, panel.end_dates + DAY, 'left')
+        self.auto_close = {}
+        for column, day in enumerate(auto_close):
+            self.auto_close.setdefault(int(day), []).append(column)
+
+        self._set_period(start, end)
+
+    def _set_period(self, start: datetime, end: datetime) -> None:
+        self.first = int(np.searchsorted(self.ns, session_label(start), 'left'))
+        self.last = int(np.searchsorted(self.ns, session_label(end), 'right')) - 1
+        self.schedule, self.rebalance_days = self._schedule()
+        self.rebalance_index = {int(day): i for i, day in enumerate(self.rebalance_days)}
+        # Intermediates with one row per rebalance date
+        self._formation = {}
+        self._selections = {}
+        self._volatility = {}
+
+    def between(self, start: datetime, end: datetime) -> 'VectorizedBacktest':
+        """
+        The same backtest over another date range, starting from cash. The
+        price panel, the volatility accumulators, the auto close dates and the
+        exclusion masks are shared with this one, only the schedule is new.
+        """
+        backtest = copy.copy(self)
+        backtest._set_period(start, end)
+        return backtest
+
+    def _schedule(self):
+        sessions = self.panel.sessions
+        months = np.asarray(sessions.year * 12 + sessions.month)
+        new_month = np.r_[True, months[1:] != months[:-1]]
+        last_of_month = np.r_[months[1:] != months[:-1], True]
+        # date_rules.month_end(1): one session before the last session of the month
+        before_last = np.r_[last_of_month[1:] & ~new_month[1:], False]
+
+        schedule = []
+        for day in range(self.first, self.last + 1):
+            if new_month[day]:
+                schedule.append((day, REBALANCE))
+            if before_last[day]:
+                schedule.append((day, SELL))
+        rebalance_days = np.array([day for day, kind in schedule if kind == REBALANCE], dtype=np.int64)
+        return schedule, rebalance_days
+
+    def formation_returns(self, ranking_periods, momentum_gap, days_per_month) -> dict:
+        """
+        Formation windows and returns for every rebalance date
+        and every ranking period in one vectorized pass.
+        Mirrors sessions_in_range(today - (J + gap) * days, today - gap * days).
+        """
+        pending = [J for J in ranking_periods if (J, momentum_gap, days_per_month) not in self._formation]
+        if pending:
+            today = self.ns[self.rebalance_days]
+            spans = (np.asarray(pending) + momentum_gap) * days_per_month * DAY
+            from_dates = today[None, :] - spans[:, None]
+            first = np.searchsorted(self.ns, from_dates, 'right')
+            last = np.searchsorted(self.ns, today - momentum_gap * days_per_month * DAY, 'right') - 1
+            # Windows starting before the panel cannot be complete
+            first[from_dates < self.ns[0] - DAY] = -1
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns = self.close[last][None, :, :] / self.close[np.maximum(first, 0)] - 1
+            complete = (self.missing[last + 1][None, :, :] - self.missing[np.maximum(first, 0)]) == 0
+            complete &= (first >= 0)[:, :, None]
+
+            for i, J in enumerate(pending):
+                self._formation[(J, momentum_gap, days_per_month)] = (first[i], last, returns[i], complete[i])
+
+        return {J: self._formation[(J, momentum_gap, days_per_month)] for J in ranking_periods}
+
+    def active(self, first_date, last_date):
+        # Tickers with trades in [first_date, last_date], see get_available_assets
+        return (self.panel.start_dates <= last_date) & (self.panel.end_dates >= first_date)
+
+    def can_trade(self, day, columns):
+        today = self.ns[day]
+        return (self.panel.start_dates[columns] <= today) & (self.panel.end_dates[columns] >= today)
+
+    def exclusion_mask(self, filters: tuple, day) -> np.ndarray:
+        # Tickers a filter set (see filter_key) excludes on a day, shared by every strategy using the set
+        key = (filters, int(day))
+        excluded = self._excluded.get(key)
+        if excluded is None:
+            filter_stocks, exclusions = filters
+            excluded = np.in1d(self.panel.tickers, list(filter_stocks))
+            if exclusions is not None:
+                excluded |= open_exclusions(exclusions).mask(self.panel.tickers, self.ns[day])
+            self._excluded[key] = excluded
+        return excluded
+
+    def excluded(self, strategy, day):
+        return self.exclusion_mask(filter_key(strategy), day)
+
+    def selections(self, ranking_period, momentum_gap, filters: tuple, amounts) -> dict:
+        """
+        Losers and winners on every rebalance date for each (losers_amount,
+        winners_amount) pair, None where the formation window is incomplete.
+        Shared by the Momentum configurations with the same ranking period,
+        gap and filter set; the returns of a date are partitioned once for all pairs.
+        """
+        amounts = [tuple(amount) for amount in amounts]
+        cached = self._selections.setdefault((ranking_period, momentum_gap, filters), {})
+        pending = sorted(set(amount for amount in amounts if amount not in cached))
+        if pending:
+            first, last, returns, complete = self.formation_returns([ranking_period],
+                                                                    momentum_gap,
+                                                                    20)[ranking_period]
+            picks = {amount: [] for amount in pending}
+            for i, day in enumerate(self.rebalance_days):
+                batch = {}
+                if first[i] >= 0:
+                    candidates = complete[i] & ~self.exclusion_mask(filters, day) & \
+                        self.active(self.ns[first[i]], self.ns[last[i]]) & \
+                        np.isfinite(returns[i])
+                    batch = select_batch(np.where(candidates, returns[i], np.nan), pending)
+                for losers_amount, winners_amount in pending:
+                    picks[(losers_amount, winners_amount)].append(batch.get((0, losers_amount, winners_amount)))
+            cached.update(picks)
+
+        return {amount: cached[amount] for amount in amounts}
+
+    def momentum_orders(self, strategy: Momentum):
+        amounts = (strategy.losers_amount, strategy.winners_amount)
+        picks = self.selections(strategy.ranking_period,
+                                strategy.momentum_gap,
+                                filter_key(strategy),
+                                [amounts])[amounts]
+
+        orders = {}
+        tranches = TrancheLedger(strategy.holding_period)
+        for day, kind in self.schedule:
+            if kind == REBALANCE:
+                selected = picks[self.rebalance_index[day]]
+                if selected is None:
+                    continue
+
+                losers, winners = selected
+                stocks = np.concatenate([losers, winners])
+                tranches.add(stocks, np.r_[np.full(len(losers), -1 / max(strategy.losers_amount, 1)),
+                                           np.full(len(winners), 1 / max(strategy.winners_amount, 1))]
+                             / strategy.holding_period)
+                self._target(orders, day, stocks, tranches)
+            else:
+                # Same bookkeeping as Momentum.sell_stocks
+                self._target(orders, day, tranches.expire(), tranches)
+
+        return orders, set()
+
+    def _target(self, orders, day, columns, tranches) -> None:
+        # Net targets over all tranches for the given columns, tradable ones only
+        columns = np.asarray(columns, dtype=np.int64)
+        tradable = self.can_trade(day, columns)
+        targets = orders.setdefault(day, {})
+        for column, weight in zip(columns[tradable], tranches.net(columns)[tradable]):
+            targets[column] = weight
+
+    def ts_momentum_orders(self, strategy: TSMomentum):
+        if strategy.filter_members is not None:
+            raise ValueError('filter_file is not supported by the vectorized engine')
+
+        first, last, returns, complete = self.formation_returns([strategy.ranking_period],
+                                                                strategy.momentum_gap,
+                                                                30)[strategy.ranking_period]
+
+        orders = {}
+        liquidations = set()
+        counter = 0
+        for day, kind in self.schedule:
+            if kind == REBALANCE:
+                i = self.rebalance_index[day]
+                if counter == 0 and first[i] >= 0:
+                    orders[day] = self._ts_targets(strategy, i, first[i], last[i], self.excluded(strategy, day))
+                counter += 1
+            else:
+                if counter == strategy.holding_period:
+                    counter = 0
+                if counter == 0:
+                    liquidations.add(day)
+
+        return orders, liquidations
+
+    def history_start(self, day):
+        # First row of TSMomentum.history on a day, None before the panel covers the lookback
+        history_from = self.ns[day] - HISTORY_DAYS * DAY
+        if history_from < self.ns[0] - DAY:
+            return None
+        return int(np.searchsorted(self.ns, history_from, 'right'))
+
+    def volatility_estimator(self, halflife=None):
+        if halflife is None:
+            return self.volatility
+        if halflife not in self._ewma:
+            self._ewma[halflife] = EwmaVolatility.from_prices(self.close, halflife)
+        return self._ewma[halflife]
+
+    def volatility_matrix(self, halflife=None) -> np.ndarray:
+        """
+        Daily volatility of every ticker over the history lookback, one row
+        per rebalance date. The inverse-vol weights are normalized, so the
+        annualization (vola_window) and vol_scale cancel out: the matrix
+        depends only on vol_halflife and is shared by every configuration using it.
+        """
+        if halflife not in self._volatility:
+            estimator = self.volatility_estimator(halflife)
+            matrix = np.full((len(self.rebalance_days), self.close.shape[1]), np.nan)
+            for i, day in enumerate(self.rebalance_days):
+                start = self.history_start(day)
+                if start is not None:
+                    matrix[i] = estimator.vol(day + 1 - start, day + 1)
+            self._volatility[halflife] = matrix
+        return self._volatility[halflife]
+
+    def _ts_targets(self, strategy, i, first, last, excluded) -> dict:
+        day = self.rebalance_days[i]
+        start = self.history_start(day)
+        if start is None:
+            return {}
+
+        # history(...).dropna(axis=1): complete over the whole lookback
+        candidates = (self.missing[day + 1] - self.missing[start]) == 0
+        candidates &= ~excluded & self.active(self.ns[first], self.ns[last])
+        columns = np.flatnonzero(candidates)
+        if len(columns) == 0:
+            return {}
+
+        # Rows before the lookback are dropped by the reindex
+        first = max(first, start)
+        returns = self.close[last, columns] / self.close[first, columns] - 1
+
+        # Volatility of daily log returns over the lookback
+        vol = self.volatility_matrix(getattr(strategy, 'vol_halflife', None))[i, columns]
+        weights = inverse_vol_weights(vol, strategy.vol_scale)
+
+        if strategy.buy_sell_strategy < 0:
+            selected = returns < 0
+        elif strategy.buy_sell_strategy > 0:
+            selected = returns > 0
+        else:
+            selected = np.ones(len(columns), dtype=bool)
+
+        return {column: weight * np.sign(ret)
+                for column, weight, ret in zip(columns[selected], weights[selected], returns[selected])}
+
+    def simulate(self, orders: dict, liquidations: set) -> np.ndarray:
+        """
+        Daily portfolio values for target-percent orders placed
+        at the close of the keyed session and filled at the next close.
+        Liquidation days close every position.
+        """
+        prices = self.prices
+        shares = np.zeros(prices.shape[1])
+        cash = float(self.capital_base)
+        values = np.empty(self.last - self.first + 1)
+
+        pending = None
+        for i, day in enumerate(range(self.first, self.last + 1)):
+            if pending is not None:
+                columns, amounts = pending
+                fill = prices[day, columns]
+                cash -= np.dot(amounts, fill) + self.commission_per_share * np.abs(amounts).sum()
+                shares[columns] += amounts
+                pending = None
+
+            closing = self.auto_close.get(day)
+            if closing is not None:
+                cash += np.dot(shares[closing], prices[day, closing])
+                shares[closing] = 0
+
+            value = cash + np.dot(shares, prices[day])
+            values[i] = value
+
+            targets = dict(orders.get(day, {}))
+            if day in liquidations:
+                held = np.flatnonzero(shares)
+                for column in held[self.can_trade(day, held)]:
+                    targets[column] = 0
+
+            if targets:
+                columns = np.fromiter(targets.keys(), dtype=np.int64, count=len(targets))
+                percents = np.fromiter(targets.values(), dtype=np.float64, count=len(targets))
+                price = prices[day, columns]
+                priced = price > 0
+                columns, percents, price = columns[priced], percents[priced], price[priced]
+
+                amounts = percents * value / price - shares[columns]
+                # zipline rounds near-integer amounts, then truncates toward zero
+                rounded = np.round(amounts)
+                amounts = np.where(np.abs(amounts - rounded) < 0.0001, rounded, np.trunc(amounts))
+                traded = amounts != 0
+                if traded.any():
+                    pending = (columns[traded], amounts[traded])
+
+        return values
+
+    def run(self, strategy: Momentum) -> pd.Series:
+        if strategy.commission is not None:
+            raise ValueError('custom commission models are not supported by the vectorized engine')
+
+        if isinstance(strategy, TSMomentum):
+            orders, liquidations = self.ts_momentum_orders(strategy)
+        else:
+            orders, liquidations = self.momentum_orders(strategy)
+
+        values = self.simulate(orders, liquidations)
+        returns = np.diff(np.r_[self.capital_base, values]) / np.r_[self.capital_base, values[:-1]]
+        return pd.Series(returns,
+                         index=self.panel.sessions[self.first:self.last + 1],
+                         name=strategy.strategy_id())
+
+    def precompute(self, plan: dict) -> None:
+        # Every shared intermediate of a plan_sweep plan, each computed once
+        for (days_per_month, gap), ranking_periods in sorted(plan['formation'].items()):
+            self.formation_returns(sorted(ranking_periods), gap, days_per_month)
+        for (ranking_period, gap, filters), amounts in plan['selections'].items():
+            self.selections(ranking_period, gap, filters, amounts)
+        for halflife in plan['volatility']:
+            self.volatility_matrix(halflife)
+
+    def run_grid(self, strategies) -> pd.DataFrame:
+        # Shared intermediates first, then every strategy only reads them
+        self.precompute(plan_sweep(strategies))
+        return pd.concat([self.run(strategy) for strategy in strategies], axis=1)
+
+
+def filter_key(strategy) -> tuple:
+    # Strategies with the same filter_stocks and exclusions exclude the same tickers
+    return tuple(sorted(strategy.filter_stocks or [])), strategy.exclusions
+
+
+def plan_sweep(strategies) -> dict:
+    """
+    The intermediates a grid of strategies shares: formation returns per
+    (days per month, gap) with the ranking periods needing them, loser and
+    winner selections per (J, gap, filter set) with their amounts, and
+    TSMomentum volatility per vol_halflife. A grid then costs
+    about the number of distinct intermediates, not the number of cells.
+    """
+    formation = {}
+    selections = {}
+    volatility = set()
+    for strategy in strategies:
+        days_per_month = 30 if isinstance(strategy, TSMomentum) else 20
+        formation.setdefault((days_per_month, strategy.momentum_gap), set()).add(strategy.ranking_period)
+        if isinstance(strategy, TSMomentum):
+            volatility.add(strategy.vol_halflife)
+        else:
+            key = (strategy.ranking_period, strategy.momentum_gap, filter_key(strategy))
+            selections.setdefault(key, set()).add((strategy.losers_amount, strategy.winners_amount))
+    return {'formation': formation, 'selections': selections, 'volatility': volatility}
+
+
+def session_label(dt: datetime) -> int:
+    # run_algorithm normalizes start and end to the session date
+    return pd.Timestamp(dt.date().isoformat(), tz='UTC').value
+
+
+def cross_check(backtest: VectorizedBacktest, strategies) -> pd.DataFrame:
+    """
+    Runs the chosen strategies through zipline and compares
+    the daily returns with the vectorized engine.
+    """
+    from main import run
+
+    rows = []
+    for strategy in strategies:
+        expected = run(strategy)['returns']
+        expected.index = expected.index.normalize()
+        actual = backtest.run(strategy)
+        expected = expected.reindex(actual.index)
+
+        rows.append({
+            'strategy': strategy.strategy_id(),
+            'max_abs_diff': (actual - expected).abs().max(),
+            'correlation': actual.corr(expected),
+            'total_return': (1 + actual).prod() - 1,
+            'zipline_total_return': (1 + expected).prod() - 1
+        })
+
+    return pd.DataFrame(rows).set_index('strategy')
+
+
+if __name__ == "__main__":
+    from main import strategy_grid
+
+    parser = argparse.ArgumentParser(description='Vectorized J x K momentum sweep')
+    parser.add_argument('--bundle', default='database_bundle2')
+    parser.add_argument('--cross-check', nargs='*', default=[], metavar='STRATEGY',
+                        help='strategy ids, e.g. CSMOM_L_3_3, to compare against a zipline run')
+    args = parser.parse_args()
+
+    start = time.time()
+    backtest = VectorizedBacktest(open_price_panel(str(build_price_panel(args.bundle))))
+    grid = strategy_grid()
+    returns = backtest.run_grid(grid)
+    print('Ran {} strategies in {:1.1f} seconds'.format(len(grid), time.time() - start))
+
+    store = ResultsStore()
+    for column in returns.columns:
+        store.write('VECTORIZED', column, returns[column])
+
+    if args.cross_check:
+        chosen = [s for s in grid if s.strategy_id() in args.cross_check]
+        print(cross_check(backtest, chosen))
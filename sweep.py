@@ -0,0 +1,138 @@
+import argparse
+import hashlib
+import itertools
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from strategies.momentum import Momentum
+from strategies.ts_momentum import TSMomentum
+from strategies.vectorized import VectorizedBacktest, plan_sweep
+from utils.price_panel import build_price_panel, open_price_panel
+from utils.result_cache import strategy_parameters
+from utils.results_store import ResultsStore
+
+"""
+Sweeps arbitrary parameter grids of Momentum and TSMomentum with the
+vectorized engine. The cells are planned first (strategies.vectorized.plan_sweep):
+formation returns depend only on (J, gap), loser/winner selections only on
+(J, gap, filter set), volatility only on vol_halflife, so each of them is
+computed once and fanned out to every cell that needs it.
+
+The inverse-vol weights of TSMomentum are normalized, so vola_window (the
+annualization) and vol_scale do not change its returns; cells differing
+only in those are run once.
+
+A grid file maps a class name to lists of constructor values, e.g.
+{"Momentum": {"ranking_period": [3, 6], "momentum_gap": [0, 1],
+              "losers_amount": [0, 10, 20], "winners_amount": [0, 10, 20]},
+ "TSMomentum": {"ranking_period": [3, 6], "vol_halflife": [null, 60]}}
+"""
+
+CLASSES = {'Momentum': Momentum, 'TSMomentum': TSMomentum}
+
+DEFAULT_GRID = {
+    'Momentum': {
+        'ranking_period': [1, 3, 6, 9, 12],
+        'holding_period': [1, 3, 6, 9, 12],
+        'momentum_gap': [0, 1],
+        'losers_amount': [0, 10, 20],
+        'winners_amount': [0, 10, 20],
+        'filter_stocks': [None, []]
+    },
+    'TSMomentum': {
+        'ranking_period': [1, 3, 6, 9, 12],
+        'holding_period': [1, 3, 6, 9, 12],
+        'momentum_gap': [0, 1],
+        'vol_halflife': [None, 60],
+        'buy_sell_strategy': [-1, 0, 1]
+    }
+}
+
+# Parameters that cancel out of the returns, per class
+NO_EFFECT = {'TSMomentum': ['vola_window', 'vol_scale']}
+
+GROUP = 'SWEEP'
+
+
+def expand(grid: dict) -> list:
+    # One strategy per combination of the listed values, for every class in the grid
+    strategies = []
+    for name, axes in sorted(grid.items()):
+        names = sorted(axes)
+        for values in itertools.product(*[axes[axis] for axis in names]):
+            strategies.append(CLASSES[name](**dict(zip(names, values))))
+    # A cross-sectional cell without losers and winners never trades
+    strategies = [s for s in strategies if type(s) is not Momentum or s.losers_amount + s.winners_amount > 0]
+
+    # The first of the cells differing only in parameters without effect
+    unique = []
+    seen = set()
+    for strategy in strategies:
+        name = type(strategy).__name__
+        parameters = strategy_parameters(strategy)
+        for parameter in NO_EFFECT.get(name, []):
+            parameters.pop(parameter)
+        key = (name, json.dumps(parameters, sort_keys=True))
+        if key not in seen:
+            seen.add(key)
+            unique.append(strategy)
+    return unique
+
+
+def cell_id(strategy) -> str:
+    # strategy_id only tells J, K and the side, the suffix tells the other parameters apart
+    parameters = json.dumps(strategy_parameters(strategy), sort_keys=True)
+    return '{}_{}'.format(strategy.strategy_id(), hashlib.sha1(parameters.encode()).hexdigest()[:8])
+
+
+def cells_table(strategies) -> pd.DataFrame:
+    rows = []
+    for strategy in strategies:
+        row = {'cell': cell_id(strategy), 'class': type(strategy).__name__}
+        row.update(strategy_parameters(strategy))
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('cell')
+
+
+def describe(plan: dict) -> str:
+    return '{} formation windows, {} selection sets, {} volatility matrices'.format(
+        sum(len(periods) for periods in plan['formation'].values()),
+        len(plan['selections']),
+        len(plan['volatility']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Multi-dimensional momentum sweep with shared intermediates')
+    parser.add_argument('--grid', default=None, metavar='PATH', help='JSON grid file, DEFAULT_GRID if omitted')
+    parser.add_argument('--bundle', default='database_bundle2')
+    parser.add_argument('--plan', action='store_true', help='only print the cells and shared intermediates')
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+
+    strategies = expand(grid)
+    plan = plan_sweep(strategies)
+    print('{} cells share {}'.format(len(strategies), describe(plan)))
+    if args.plan:
+        raise SystemExit(0)
+
+    start = time.time()
+    backtest = VectorizedBacktest(open_price_panel(str(build_price_panel(args.bundle))))
+    backtest.precompute(plan)
+    print('Computed the shared intermediates in {:1.1f} seconds'.format(time.time() - start))
+
+    returns = backtest.run_grid(strategies)
+    returns.columns = [cell_id(strategy) for strategy in strategies]
+    print('Ran {} cells in {:1.1f} seconds'.format(len(strategies), time.time() - start))
+
+    store = ResultsStore()
+    for column in returns.columns:
+        store.write(GROUP, column, returns[column])
+    cells = cells_table(strategies)
+    cells.to_csv(str(Path(store.root) / GROUP / 'cells.csv'))
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.data_quality import ExclusionMask, build_exclusions, run_lengths
+from utils.price_panel import PricePanel
+
+SESSIONS = pd.bdate_range('2018-01-01', periods=4, tz='UTC')
+# Eleven tickers, the bits of a session span two bytes
+TICKERS = np.array(['T{:02d}'.format(i) for i in range(11)])
+
+
+def random_mask(seed=3) -> np.ndarray:
+    return np.random.RandomState(seed).rand(len(SESSIONS), len(TICKERS)) < 0.4
+
+
+def test_packed_rows_unpack_to_the_mask(tmp_path):
+    mask = random_mask()
+    exclusions = ExclusionMask.from_mask(SESSIONS.asi8, TICKERS, mask)
+    assert exclusions.bits.shape == (4, 2)
+
+    path = tmp_path / 'exclusions.npz'
+    exclusions.save(path)
+    loaded = ExclusionMask.load(path)
+    for i, session in enumerate(SESSIONS):
+        assert loaded.row(session).tolist() == mask[i].tolist()
+        assert loaded.excluded(session).tolist() == TICKERS[mask[i]].tolist()
+
+
+def test_dates_use_the_last_session_on_or_before():
+    mask = random_mask()
+    exclusions = ExclusionMask.from_mask(SESSIONS.asi8, TICKERS, mask)
+
+    assert exclusions.row(datetime(2017, 12, 29)).tolist() == [False] * len(TICKERS)
+    assert exclusions.row(datetime(2018, 1, 3, 18)).tolist() == mask[2].tolist()
+    assert exclusions.row(datetime(2018, 2, 1)).tolist() == mask[3].tolist()
+
+
+def test_lookups_by_ticker_keep_unknown_tickers():
+    mask = np.zeros((len(SESSIONS), len(TICKERS)), dtype=bool)
+    mask[1, [2, 9]] = True
+    # Stored in another order than sorted, lookups go through the sort order
+    exclusions = ExclusionMask.from_mask(SESSIONS.asi8, TICKERS[::-1], mask)
+
+    flags = exclusions.mask(['T01', 'XXXX', 'T08', 'T09', 'ZZZZ'], SESSIONS[1])
+    assert flags.tolist() == [True, False, True, False, False]
+    assert exclusions.mask([], SESSIONS[1]).tolist() == []
+
+
+def test_stale_bars_and_zero_volume_streaks_are_excluded():
+    sessions = pd.bdate_range('2018-01-01', periods=10, tz='UTC')
+    close = np.tile(np.arange(1.0, 11.0)[:, None], (1, 3))
+    volume = np.ones_like(close)
+    close[2:6, 1] = close[2, 1]
+    volume[2:6, 1] = 1.0
+    volume[5:9, 2] = 0.0
+    panel = PricePanel(sessions.asi8, ['A', 'B', 'C'], [sessions[0].value] * 3, [sessions[-1].value] * 3,
+                       {'close': close, 'adj_close': close, 'volume': volume})
+
+    assert run_lengths(volume == 0)[:, 2].tolist() == [0, 0, 0, 0, 0, 1, 2, 3, 4, 0]
+    exclusions = build_exclusions(panel, window=3, max_stale_run=2, max_zero_volume_run=3)
+    excluded = np.array([exclusions.row(session) for session in sessions])
+    # B is carried forward a third day on 2018-01-08, C trades nothing a fourth day on 2018-01-11;
+    # both stay excluded for the 3-session window
+    assert excluded[:, 0].tolist() == [False] * 10
+    assert excluded[:, 1].tolist() == [False] * 5 + [True] * 3 + [False] * 2
+    assert excluded[:, 2].tolist() == [False] * 8 + [True] * 2
@@ -0,0 +1,70 @@
+import pandas as pd
+from sqlalchemy import create_engine
+
+from database_bundle import load_adjustments, stream_equity_history
+
+
+def history_engine():
+    engine = create_engine('sqlite://')
+    rows = [('AAAA', '2018-01-03'), ('AAAA', '2018-01-04'), ('AAAA', '2018-01-05'),
+            ('BBBB', '2018-01-04'),
+            ('CCCC', '2018-01-03'), ('CCCC', '2018-01-04'), ('CCCC', '2018-01-05'), ('CCCC', '2018-01-08')]
+    history = pd.DataFrame(rows, columns=['ticker', 'trade_date'])
+    history['trade_date'] = pd.to_datetime(history['trade_date'])
+    history['close'] = history['open'] = history['high'] = history['low'] = 2.0
+    history['volume'] = 100.0
+    history.to_sql('equity_history', engine, index=False)
+    pd.DataFrame({'ticker': ['AAAA', 'BBBB', 'CCCC'], 'lot': [1, 10, 100]}).to_sql('instruments', engine, index=False)
+    return engine
+
+
+def test_tickers_split_across_chunks_are_yielded_whole():
+    engine = history_engine()
+    with engine.connect() as con:
+        streamed = list(stream_equity_history(con, chunksize=2))
+
+    assert [(ticker, len(df)) for ticker, df in streamed] == [('AAAA', 3), ('BBBB', 1), ('CCCC', 4)]
+    for ticker, df in streamed:
+        assert (df['ticker'] == ticker).all()
+        assert df.index.is_monotonic_increasing
+    assert streamed[1][1]['close'].tolist() == [20.0]
+
+
+def test_incremental_stream_starts_after_the_watermark():
+    engine = history_engine()
+    with engine.connect() as con:
+        streamed = dict(stream_equity_history(con, chunksize=3, since=pd.Timestamp('2018-01-04')))
+
+    assert sorted(streamed) == ['AAAA', 'CCCC']
+    assert streamed['AAAA'].index.tolist() == [pd.Timestamp('2018-01-05')]
+    assert streamed['CCCC'].index.tolist() == [pd.Timestamp('2018-01-05'), pd.Timestamp('2018-01-08')]
+
+
+def bundle_metadata():
+    return pd.DataFrame({'symbol': ['AAAA', 'BBBB']}, index=[0, 1])
+
+
+def test_adjustments_are_empty_without_the_optional_tables():
+    engine = history_engine()
+    with engine.connect() as con:
+        splits, divs = load_adjustments(bundle_metadata(), con)
+
+    assert splits.empty and list(splits.columns) == ['sid', 'ratio', 'effective_date']
+    assert divs.empty and list(divs.columns) == ['sid', 'amount', 'ex_date', 'record_date', 'declared_date', 'pay_date']
+
+
+def test_adjustments_map_tickers_to_sids():
+    engine = history_engine()
+    pd.DataFrame({'ticker': ['BBBB', 'ZZZZ'], 'ex_date': pd.to_datetime(['2018-01-04', '2018-01-05']),
+                  'amount': [0.5, 1.0]}).to_sql('dividends', engine, index=False)
+    pd.DataFrame({'ticker': ['AAAA'], 'effective_date': pd.to_datetime(['2018-01-05']),
+                  'ratio': [0.5]}).to_sql('splits', engine, index=False)
+    with engine.connect() as con:
+        splits, divs = load_adjustments(bundle_metadata(), con)
+
+    assert divs['sid'].tolist() == [1]
+    assert divs['amount'].tolist() == [0.5]
+    assert divs['ex_date'].tolist() == [pd.Timestamp('2018-01-04')]
+    assert splits['sid'].tolist() == [0]
+    assert splits['ratio'].tolist() == [0.5]
+    assert splits['effective_date'].tolist() == [pd.Timestamp('2018-01-05')]
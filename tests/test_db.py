@@ -0,0 +1,54 @@
+import pandas as pd
+
+import utils.db as db
+from utils.profiling import profiler
+
+
+def prices_engine():
+    engine = db.get_engine('sqlite://')
+    pd.DataFrame({'ticker': ['AAAA', 'BBBB'], 'close': [1.0, 2.0]}).to_sql('prices', engine, index=False,
+                                                                            if_exists='replace')
+    return engine
+
+
+def test_engines_are_created_once_per_process_and_url(monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'sqlite://')
+    engine = db.get_engine()
+    assert db.get_engine('sqlite://') is engine
+    assert db.get_engine('sqlite:///:memory:') is not engine
+
+    # A forked worker has another pid and gets its own engine
+    monkeypatch.setattr(db.os, 'getpid', lambda: -1)
+    assert db.get_engine() is not engine
+
+
+def test_server_engines_get_a_sized_pool(monkeypatch):
+    monkeypatch.setenv('DATABASE_POOL_SIZE', '2')
+    assert db.engine_options('sqlite:///data/offline.db') == {}
+    options = db.engine_options(db.DEFAULT_URL)
+    assert options['pool_size'] == 2 and options['max_overflow'] == 10 and options['pool_pre_ping']
+
+
+def test_read_query_binds_values(monkeypatch):
+    engine = prices_engine()
+    query = 'select ticker, close from prices where ticker = :ticker'
+
+    assert db.read_query(query, engine, params={'ticker': 'BBBB'})['close'].tolist() == [2.0]
+    # A bound value is never SQL
+    assert db.read_query(query, engine, params={'ticker': "AAAA' or '1' = '1"}).empty
+
+    monkeypatch.setattr(profiler, 'enabled', True)
+    monkeypatch.setattr(profiler, 'counters', {})
+    db.read_query('select * from prices', engine)
+    assert profiler.counters['sql_rows'] == 2 and profiler.counters['sql_bytes'] > 0
+
+
+def test_copy_tables_skips_missing_ones():
+    source = prices_engine()
+    pd.DataFrame({'ticker': ['AAAA'], 'lot': [10]}).to_sql('instruments', source, index=False, if_exists='replace')
+    target = db.get_engine('sqlite:///:memory:')
+    db.copy_tables(source, target, ['instruments', 'prices', 'dividends'], chunksize=1)
+
+    assert db.has_table('prices', target) and db.has_table('instruments', target)
+    assert not db.has_table('dividends', target)
+    assert db.read_query('select ticker from prices order by ticker', target)['ticker'].tolist() == ['AAAA', 'BBBB']
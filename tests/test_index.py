@@ -0,0 +1,48 @@
+import pandas
+from sqlalchemy import create_engine
+
+from index import load, records, to_volume
+
+MICEX = 'data/micex.csv'
+
+
+def candle_count(engine) -> int:
+    return engine.execute('select count(*) from candles').scalar()
+
+
+def test_reloading_upserts_instead_of_duplicating():
+    engine = create_engine('sqlite://')
+    loaded = load([(MICEX, 260)], engine, chunksize=500)
+    assert loaded == candle_count(engine) > 0
+
+    load([(MICEX, 260)], engine, chunksize=500)
+    assert candle_count(engine) == loaded == len(pandas.read_csv(MICEX))
+    close = engine.execute("select close from candles where time like '2018-12-28%'").scalar()
+    assert close == 5551.96
+
+
+def test_existing_duplicates_are_removed_before_the_key_is_added():
+    engine = create_engine('sqlite://')
+    frame = pandas.DataFrame({'time': pandas.to_datetime(['2018-12-28', '2018-12-28']),
+                              'close': [1.0, 2.0], 'open': 1.0, 'low': 1.0, 'high': 1.0, 'volume': 0.0,
+                              'instrument_id': 260})
+    frame.to_sql('candles', engine, index=False)
+
+    load([(MICEX, 260)], engine, chunksize=500)
+    assert engine.execute("select count(*) from candles where instrument_id = 260 "
+                          "and close = 2.0").scalar() == 0
+    assert candle_count(engine) == len(pandas.read_csv(MICEX))
+
+
+def test_records_are_plain_python_values():
+    frame = pandas.DataFrame({'time': pandas.to_datetime(['2018-12-28']), 'close': [float('nan')], 'open': 1.0,
+                              'low': 1.0, 'high': 1.0, 'volume': 2.0, 'instrument_id': 260})
+    record = records(frame)[0]
+    assert type(record['time']).__name__ == 'datetime'
+    assert record['close'] is None
+    assert type(record['instrument_id']) is int
+
+
+def test_volume_suffixes():
+    volumes = to_volume(pandas.Series(['1.25M', '830.5K', '-', '2B']))
+    assert volumes.tolist() == [1250000.0, 830500.0, 0.0, 2000000000.0]
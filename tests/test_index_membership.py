@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from utils.index_membership import IndexMembership
+
+
+def write_filter_file(path):
+    # Out of date order on purpose, rows are sorted when parsed
+    path.write_text('date,tickers\n'
+                    '2018-07-01,GAZP;LKOH;SBER\n'
+                    '2018-01-01,GAZP;SBER;YNDX\n')
+    return str(path)
+
+
+def test_members_are_those_of_the_last_row_before_the_date(tmp_path):
+    membership = IndexMembership.from_csv(write_filter_file(tmp_path / 'filter.csv'))
+
+    assert membership.tickers.tolist() == ['GAZP', 'LKOH', 'SBER', 'YNDX']
+    # Strictly before: on the day of a row the previous row still applies
+    assert membership.members(datetime(2018, 7, 1)).tolist() == ['GAZP', 'SBER', 'YNDX']
+    assert membership.members(datetime(2018, 7, 2)).tolist() == ['GAZP', 'LKOH', 'SBER']
+    # Before the file: the first row
+    assert membership.members(datetime(2017, 6, 1)).tolist() == ['GAZP', 'SBER', 'YNDX']
+
+
+def test_contains_looks_tickers_up_in_the_vocabulary(tmp_path):
+    membership = IndexMembership.from_csv(write_filter_file(tmp_path / 'filter.csv'))
+
+    flags = membership.contains(['YNDX', 'AAAA', 'LKOH', 'ZZZZ', 'SBER'], datetime(2018, 3, 1))
+    assert flags.tolist() == [True, False, False, False, True]
+    flags = membership.contains(['YNDX', 'AAAA', 'LKOH', 'ZZZZ', 'SBER'], datetime(2018, 12, 1))
+    assert flags.tolist() == [False, False, True, False, True]
+    assert membership.contains([], datetime(2018, 3, 1)).tolist() == []
+
+
+def test_tickers_missing_from_the_universe_are_dropped(tmp_path):
+    membership = IndexMembership.from_csv(write_filter_file(tmp_path / 'filter.csv'), ['SBER', 'LKOH', 'MGNT'])
+
+    assert membership.tickers.tolist() == ['LKOH', 'SBER']
+    assert membership.members(datetime(2018, 3, 1)).tolist() == ['SBER']
+    assert membership.contains(['YNDX', 'LKOH'], datetime(2018, 12, 1)).tolist() == [False, True]
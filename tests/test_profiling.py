@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine
+
+from utils.profiling import Profiler, profiled, profiler
+
+
+def test_disabled_profiler_records_nothing():
+    disabled = Profiler()
+    with disabled.timer('rebalance'):
+        pass
+    disabled.count('sql_rows', 10)
+
+    assert disabled.report() == {'stages': {}, 'counters': {}}
+
+
+def test_timings_and_counters_are_reported(tmp_path):
+    enabled = Profiler(enabled=True)
+    for seconds in [0.1, 0.2, 0.3, 0.4]:
+        enabled.record('history', seconds)
+    with pytest.raises(ValueError):
+        with enabled.timer('rebalance'):
+            raise ValueError()
+    enabled.count('sql_rows', 5)
+    enabled.count('sql_rows', 7)
+
+    report = enabled.report()
+    assert report['counters'] == {'sql_rows': 12}
+    assert report['stages']['history']['calls'] == 4
+    assert report['stages']['history']['total'] == pytest.approx(1.0)
+    assert report['stages']['history']['p50'] == pytest.approx(0.25)
+    assert report['stages']['history']['max'] == pytest.approx(0.4)
+    # A call that raised is timed too
+    assert report['stages']['rebalance']['calls'] == 1
+
+    path = tmp_path / 'profile' / 'TSMOM_L_3_3.json'
+    enabled.dump(path, strategy='TSMOM_L_3_3')
+    with path.open() as f:
+        assert json.load(f)['strategy'] == 'TSMOM_L_3_3'
+
+    enabled.reset()
+    assert enabled.report() == {'stages': {}, 'counters': {}}
+
+
+def test_profiled_functions_are_timed_only_when_enabled(monkeypatch):
+    @profiled('sell_stocks')
+    def sell(amount):
+        return amount * 2
+
+    monkeypatch.setattr(profiler, 'timings', {})
+    monkeypatch.setattr(profiler, 'enabled', False)
+    assert sell(2) == 4
+    assert profiler.timings == {}
+
+    monkeypatch.setattr(profiler, 'enabled', True)
+    assert sell(3) == 6
+    assert len(profiler.timings['sell_stocks']) == 1
+    assert sell.__name__ == 'sell'
+
+
+def test_sql_round_trips_are_counted():
+    counting = Profiler()
+    counting.enable()
+    engine = create_engine('sqlite://')
+    with engine.connect() as con:
+        # Connecting may run the dialect's own statements first
+        before = counting.counters.get('sql_round_trips', 0)
+        con.execute('select 1')
+        con.execute('select 2')
+
+    assert counting.counters['sql_round_trips'] - before == 2
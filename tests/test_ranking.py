@@ -0,0 +1,35 @@
+import numpy as np
+
+from utils.ranking import formation_returns, select, select_batch
+
+
+def test_select_picks_the_extremes_past_the_thresholds():
+    returns = np.array([0.05, -0.2, 0.005, np.nan, -0.01, 0.3, 0.02, -0.05])
+    losers, winners = select(returns, 2, 2)
+    assert losers.tolist() == [1, 7]
+    assert winners.tolist() == [0, 5]
+
+
+def test_select_returns_fewer_when_not_enough_pass():
+    losers, winners = select(np.array([0.005, 0.02, -0.01]), 5, 5)
+    assert losers.tolist() == [2]
+    assert winners.tolist() == [1]
+
+
+def test_select_batch_matches_select_for_every_amount():
+    random = np.random.RandomState(7)
+    returns = random.normal(0, 0.1, (3, 50))
+    amounts = [(10, 10), (20, 0), (0, 20), (5, 3)]
+    batch = select_batch(returns, amounts)
+    for row in range(len(returns)):
+        for losers_amount, winners_amount in amounts:
+            losers, winners = select(returns[row], losers_amount, winners_amount)
+            batch_losers, batch_winners = batch[(row, losers_amount, winners_amount)]
+            assert batch_losers.tolist() == losers.tolist()
+            assert batch_winners.tolist() == winners.tolist()
+
+
+def test_formation_returns_masks_missing_prices():
+    returns = formation_returns([100.0, 0.0, np.nan], [110.0, 5.0, 10.0])
+    np.testing.assert_allclose(returns[0], 0.1)
+    assert np.isnan(returns[1:]).all()
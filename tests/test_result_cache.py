@@ -0,0 +1,36 @@
+import os
+
+from utils.result_cache import ResultCache
+
+
+def write(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'x' * size)
+    return path
+
+
+def test_hits_link_the_entry_to_the_output(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), outputs=str(tmp_path / 'out'))
+    source = write(tmp_path / 'out' / 'TSMOM' / 'a.h5', 10)
+    cache.put('aa11', source)
+    source.unlink()
+
+    assert cache.get('aa11', source)
+    assert source.read_bytes() == b'x' * 10
+    assert os.path.samefile(str(source), str(cache.path('aa11')))
+    assert not cache.get('bb22', tmp_path / 'out' / 'TSMOM' / 'b.h5')
+
+
+def test_eviction_removes_linked_outputs_and_keeps_the_current_run(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=25, outputs=str(tmp_path / 'out'))
+    for age, key in enumerate(['aa11', 'bb22', 'cc33']):
+        output = write(tmp_path / 'out' / 'CSMOM' / '{}.h5'.format(key), 10)
+        cache.put(key, output)
+        os.utime(str(cache.path(key)), (age, age))
+    orphan = write(tmp_path / 'out' / 'CSMOM' / 'orphan.h5', 10)
+
+    assert cache.evict(keep=['aa11']) == 1
+    assert [path.stem for _, _, path in cache.entries()] == ['aa11', 'cc33']
+    assert not (tmp_path / 'out' / 'CSMOM' / 'bb22.h5').exists()
+    assert (tmp_path / 'out' / 'CSMOM' / 'aa11.h5').exists()
+    assert orphan.exists()
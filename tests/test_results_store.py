@@ -0,0 +1,62 @@
+import pandas as pd
+
+from utils.results_store import ResultsStore
+
+
+def perf_frame() -> pd.DataFrame:
+    index = pd.date_range('2018-01-01', periods=4, freq='D', tz='UTC')
+    return pd.DataFrame({
+        'returns': [0.0, 0.01, -0.02, 0.005],
+        'portfolio_value': [100.0, 101.0, 98.98, 99.47],
+        'orders': [[], [{'id': 'a'}], [], []],
+        'positions': [[], [{'sid': 3, 'amount': 10, 'cost_basis': 9.5, 'last_sale_price': 10.1}],
+                      [{'sid': 3, 'amount': 10, 'cost_basis': 9.5, 'last_sale_price': 9.8},
+                       {'sid': 5, 'amount': -4, 'cost_basis': 20.0, 'last_sale_price': 19.0}], []],
+        'transactions': [[], [{'sid': 3, 'dt': index[1], 'amount': 10, 'price': 9.5, 'commission': 0.01,
+                               'order_id': 'a'}], [], []]
+    }, index=index, columns=['returns', 'portfolio_value', 'orders', 'positions', 'transactions'])
+
+
+def test_write_and_read_round_trip(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    perf = perf_frame()
+    store.write('CSMOM', 'CSMOM_L_3_3', perf)
+
+    daily = store.read('CSMOM', 'CSMOM_L_3_3')
+    assert list(daily.columns) == ['returns', 'portfolio_value']
+    assert daily.index.equals(perf.index)
+    assert daily.values.tolist() == perf[['returns', 'portfolio_value']].values.tolist()
+
+    positions = store.positions('CSMOM', 'CSMOM_L_3_3')
+    assert positions[['sid', 'amount']].values.tolist() == [[3, 10], [3, 10], [5, -4]]
+    assert positions['last_sale_price'].tolist() == [10.1, 9.8, 19.0]
+
+    transactions = store.transactions('CSMOM', 'CSMOM_L_3_3', start='2018-01-02', end='2018-01-02')
+    assert transactions[['sid', 'amount', 'price', 'order_id']].values.tolist() == [[3, 10.0, 9.5, 'a']]
+
+
+def test_rewriting_replaces_the_file(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    store.write('TSMOM', 'TSMOM_L_3_3', perf_frame())
+    store.write('TSMOM', 'TSMOM_L_3_3', perf_frame()['returns'] * 2)
+
+    assert list(store.read('TSMOM', 'TSMOM_L_3_3').columns) == ['returns']
+    assert store.read('TSMOM', 'TSMOM_L_3_3')['returns'].tolist() == [0.0, 0.02, -0.04, 0.01]
+    assert store.positions('TSMOM', 'TSMOM_L_3_3').empty
+
+
+def test_daily_columns_of_many_strategies(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    returns = perf_frame()['returns']
+    store.write('CSMOM', 'A', returns)
+    store.write('CSMOM', 'B', returns * 2)
+    store.write('TSMOM', 'A', returns * 3)
+
+    assert store.strategies() == [('CSMOM', 'A'), ('CSMOM', 'B'), ('TSMOM', 'A')]
+    by_id = store.returns('CSMOM', start='2018-01-02', end='2018-01-03')
+    assert sorted(by_id.columns) == ['A', 'B']
+    assert by_id['B'].tolist() == [0.02, -0.04]
+
+    everything = store.returns(strategy_ids=['A'])
+    assert sorted(everything.columns) == [('CSMOM', 'A'), ('TSMOM', 'A')]
+    assert everything[('TSMOM', 'A')].tolist() == [0.0, 0.03, -0.06, 0.015]
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pandas as pd
+
+import utils.trading_utils as trading_utils
+from utils.sessions import SessionCalendar
+
+# Weekdays of two weeks, 2018-01-01 to 2018-01-12
+SESSIONS = pd.bdate_range('2018-01-01', '2018-01-12', tz='UTC')
+
+
+def test_ranges_include_both_bounds():
+    calendar = SessionCalendar(SESSIONS)
+
+    assert calendar.sessions_in_range(datetime(2018, 1, 3), datetime(2018, 1, 5)).equals(SESSIONS[2:5])
+    # Weekend bounds snap inwards
+    assert calendar.sessions_in_range(datetime(2018, 1, 6), datetime(2018, 1, 14)).equals(SESSIONS[5:])
+    assert calendar.count(datetime(2017, 12, 1), datetime(2018, 1, 2)) == 2
+    assert calendar.count(datetime(2018, 1, 6), datetime(2018, 1, 7)) == 0
+    assert calendar.count(datetime(2018, 1, 10), datetime(2018, 1, 8)) == 0
+
+
+def test_lookbacks_and_nearest_sessions():
+    calendar = SessionCalendar(SESSIONS)
+
+    assert calendar.sessions_back(datetime(2018, 1, 7), 3).equals(SESSIONS[2:5])
+    assert calendar.sessions_back(datetime(2018, 1, 2), 5).equals(SESSIONS[:2])
+    assert calendar.session_on_or_before(datetime(2018, 1, 7)) == SESSIONS[4]
+    assert calendar.session_on_or_after(datetime(2018, 1, 7)) == SESSIONS[5]
+    assert calendar.session_on_or_after(datetime(2018, 1, 8)) == SESSIONS[5]
+    assert calendar.session_on_or_before(datetime(2017, 12, 31)) is None
+    assert calendar.session_on_or_after(datetime(2018, 1, 13)) is None
+
+
+def test_bounds_are_kept_in_an_lru_cache():
+    calendar = SessionCalendar(SESSIONS, cache_size=2)
+    first = calendar.bounds(datetime(2018, 1, 3), datetime(2018, 1, 5))
+    assert calendar.bounds(datetime(2018, 1, 3), datetime(2018, 1, 5)) == first == (2, 5)
+    assert calendar._bounds.cache_info().hits == 1
+
+    calendar.count(datetime(2018, 1, 1), datetime(2018, 1, 2))
+    calendar.count(datetime(2018, 1, 8), datetime(2018, 1, 9))
+    info = calendar._bounds.cache_info()
+    assert info.currsize == 2 and info.misses == 3
+
+    # Evicted as the least recently used range, searched again
+    calendar.bounds(datetime(2018, 1, 3), datetime(2018, 1, 5))
+    assert calendar._bounds.cache_info().misses == 4
+
+
+def test_cumulative_returns_snap_to_sessions(monkeypatch):
+    calendar = SessionCalendar(SESSIONS)
+    monkeypatch.setattr(trading_utils, 'get_session_calendar', lambda name: calendar)
+    prices = pd.Series(range(1, len(SESSIONS) + 1), index=SESSIONS, dtype=float)
+
+    # Saturday to Sunday: Monday 2018-01-08 to Friday 2018-01-12
+    assert trading_utils.cumulative_returns(prices, datetime(2018, 1, 6), datetime(2018, 1, 14)) == 10.0 / 6 - 1
+    assert trading_utils.cumulative_returns(prices, datetime(2018, 1, 2), datetime(2018, 1, 3)) == 3.0 / 2 - 1
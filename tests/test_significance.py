@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from significance import (bootstrap_weights, exceedance, moments, sign_flip_weights, significance,
+                          stationary_indices)
+
+
+def test_stationary_indices_run_in_circular_blocks():
+    random = np.random.RandomState(1)
+    indices = stationary_indices(random, 4, 30, block=1e9)
+    assert indices.shape == (4, 30)
+    # One block per resample: consecutive days, wrapping around the end
+    np.testing.assert_array_equal(indices, (indices[:, :1] + np.arange(30)) % 30)
+
+    indices = stationary_indices(random, 50, 30, block=5.0)
+    assert indices.min() >= 0 and indices.max() < 30
+
+
+def test_bootstrap_weights_count_every_drawn_day():
+    weights = bootstrap_weights(np.random.RandomState(2), 20, 40, block=5.0)
+    assert weights.shape == (20, 40)
+    np.testing.assert_array_equal(weights.sum(axis=1), 40)
+
+
+def test_sign_flip_weights_keep_the_sign_within_a_block():
+    weights = sign_flip_weights(np.random.RandomState(3), 10, 23, block=5)
+    assert weights.shape == (10, 23)
+    assert set(np.unique(weights)) <= {-1.0, 1.0}
+    for start in range(0, 23, 5):
+        block = weights[:, start:start + 5]
+        assert (block == block[:, :1]).all()
+
+
+def test_moments_match_mean_and_sharpe():
+    returns = np.random.RandomState(4).normal(0.001, 0.01, (250, 3))
+    mean, sharpe = moments(np.ones((1, 250)), returns)
+    np.testing.assert_allclose(mean[0], returns.mean(axis=0))
+    np.testing.assert_allclose(sharpe[0], returns.mean(axis=0) / returns.std(axis=0, ddof=1) * np.sqrt(252))
+
+
+def test_exceedance_counts_the_observed_value():
+    assert exceedance(np.array([1.0, 2.0, 3.0]), np.array([2.5]))[0] == 0.5
+    assert exceedance(np.array([1.0, 2.0, 3.0]), np.array([5.0]))[0] == 0.25
+
+
+def test_results_do_not_depend_on_the_process_count():
+    random = np.random.RandomState(5)
+    returns = pd.DataFrame({
+        'drift': random.normal(0.004, 0.01, 500),
+        'noise': random.normal(0.0, 0.01, 500)
+    })
+    one = significance(returns, resamples=200, block=10.0, batch_size=50, processes=1)
+    two = significance(returns, resamples=200, block=10.0, batch_size=50, processes=2)
+    pd.testing.assert_frame_equal(one, two)
+
+    assert one.loc['drift', 'p_spa'] < 0.05
+    assert one.loc['drift', 'mean_return_low'] > 0
+    assert one.loc['noise', 'p_sign_flip_adjusted'] > one.loc['drift', 'p_sign_flip_adjusted']
@@ -0,0 +1,42 @@
+from strategies.momentum import Momentum
+from strategies.ts_momentum import TSMomentum
+from strategies.vectorized import filter_key, plan_sweep
+from sweep import DEFAULT_GRID, cell_id, expand
+
+
+def test_cells_differing_only_in_parameters_without_effect_run_once():
+    strategies = expand({'TSMomentum': {'ranking_period': [3, 6], 'vola_window': [60, 121, 242],
+                                        'vol_scale': [0.2, 0.4], 'vol_halflife': [None, 60]}})
+
+    assert len(strategies) == 4
+    assert all(type(s) is TSMomentum for s in strategies)
+    assert sorted((s.ranking_period, s.vol_halflife or 0) for s in strategies) == [(3, 0), (3, 60), (6, 0), (6, 60)]
+    assert len(set(cell_id(s) for s in strategies)) == 4
+
+
+def test_momentum_cells_without_losers_and_winners_are_dropped():
+    strategies = expand({'Momentum': {'losers_amount': [0, 10], 'winners_amount': [0, 10]}})
+
+    assert sorted((s.losers_amount, s.winners_amount) for s in strategies) == [(0, 10), (10, 0), (10, 10)]
+
+
+def test_plan_shares_intermediates_between_cells():
+    strategies = expand({
+        'Momentum': {'ranking_period': [3, 6], 'momentum_gap': [0, 1], 'losers_amount': [0, 10],
+                     'winners_amount': [10, 20], 'filter_stocks': [None, []]},
+        'TSMomentum': {'ranking_period': [3, 12], 'momentum_gap': [1], 'vola_window': [60, 242],
+                       'vol_halflife': [None, 60]}
+    })
+    plan = plan_sweep(strategies)
+
+    assert plan['formation'] == {(20, 0): {3, 6}, (20, 1): {3, 6}, (30, 1): {3, 12}}
+    filters = {filter_key(Momentum()), filter_key(Momentum(filter_stocks=[]))}
+    assert set(plan['selections']) == {(J, gap, f) for J in [3, 6] for gap in [0, 1] for f in filters}
+    assert all(amounts == {(0, 10), (0, 20), (10, 10), (10, 20)} for amounts in plan['selections'].values())
+    assert plan['volatility'] == {None, 60}
+
+
+def test_default_grid_has_no_duplicate_cells():
+    strategies = expand(DEFAULT_GRID)
+
+    assert len(set(cell_id(s) for s in strategies)) == len(strategies)
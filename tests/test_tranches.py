@@ -0,0 +1,39 @@
+import numpy as np
+
+from utils.tranches import TrancheLedger
+
+
+def test_overlapping_tranches_are_netted():
+    ledger = TrancheLedger(holding_period=3)
+    ledger.add([1, 2], [0.1, -0.1])
+    ledger.add([2, 3], [0.1, 0.1])
+
+    sids, weights = ledger.targets()
+    assert sids.tolist() == [1, 2, 3]
+    np.testing.assert_allclose(weights, [0.1, 0.0, 0.1])
+    np.testing.assert_allclose(ledger.net([3, 1, 7]), [0.1, 0.1, 0.0])
+
+
+def test_tranches_expire_after_the_holding_period():
+    ledger = TrancheLedger(holding_period=2)
+    ledger.add([1, 2], 0.5)
+    assert ledger.expire().tolist() == []
+    ledger.add([2, 3], 0.25)
+    assert len(ledger) == 2
+
+    assert ledger.expire().tolist() == [1, 2]
+    assert len(ledger) == 1
+    np.testing.assert_allclose(ledger.net([1, 2, 3]), [0.0, 0.25, 0.25])
+
+    assert ledger.expire().tolist() == [2, 3]
+    assert len(ledger) == 0
+    assert ledger.net([2]).tolist() == [0.0]
+
+
+def test_ledger_grows_past_its_capacity():
+    ledger = TrancheLedger(holding_period=1, capacity=2)
+    ledger.add([4, 5, 6], 1.0)
+    ledger.add([7], 1.0)
+    sids, weights = ledger.targets()
+    assert sids.tolist() == [4, 5, 6, 7]
+    np.testing.assert_allclose(weights, 1.0)
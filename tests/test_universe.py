@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import pandas as pd
+import pytz
+
+from utils.universe import AssetUniverse
+
+
+def universe():
+    return AssetUniverse.from_frame(pd.DataFrame({
+        'ticker': ['SBER', 'AFLT', 'GAZP'],
+        'first_date': pd.to_datetime(['2012-01-03', '2015-06-01', '2012-01-03']),
+        'last_date': pd.to_datetime(['2018-12-28', '2018-12-28', '2014-03-31'])
+    }))
+
+
+def test_tickers_are_sorted():
+    assert universe().tickers.tolist() == ['AFLT', 'GAZP', 'SBER']
+
+
+def test_active_overlaps_the_interval():
+    assets = universe()
+    assert assets.active(datetime(2013, 1, 1), datetime(2013, 12, 31)).tolist() == ['GAZP', 'SBER']
+    assert assets.active(datetime(2014, 3, 31), datetime(2015, 6, 1)).tolist() == ['AFLT', 'GAZP', 'SBER']
+    assert assets.active(datetime(2016, 1, 1), datetime(2016, 2, 1)).tolist() == ['AFLT', 'SBER']
+    assert len(assets.active()) == 3
+
+
+def test_session_labels_in_utc_match_trade_dates():
+    assets = universe()
+    first = pytz.utc.localize(datetime(2014, 3, 31))
+    assert assets.active(first, first).tolist() == ['GAZP', 'SBER']
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from strategies.momentum import Momentum
+from strategies.vectorized import REBALANCE, SELL, VectorizedBacktest
+from utils.price_panel import PricePanel
+from utils.ranking import select
+from utils.tranches import TrancheLedger
+
+# Daily growth of each ticker, so formation returns rank the tickers in column order
+GROWTH = np.array([-0.004, -0.003, -0.002, 0.0, 0.001, 0.002, 0.003, 0.004])
+
+DELISTED = 7
+DELISTED_AFTER = pd.Timestamp('2016-06-15', tz='UTC')
+
+
+def synthetic_panel() -> PricePanel:
+    sessions = pd.bdate_range('2015-06-01', '2016-12-30', tz='UTC')
+    close = 10.0 * (1 + GROWTH[None, :]) ** np.arange(len(sessions))[:, None]
+    end_dates = np.full(len(GROWTH), sessions[-1].value)
+    end_dates[DELISTED] = DELISTED_AFTER.value
+    close[sessions > DELISTED_AFTER, DELISTED] = np.nan
+    return PricePanel(sessions=sessions.asi8,
+                      tickers=np.array(['T{}'.format(i) for i in range(len(GROWTH))]),
+                      start_dates=np.full(len(GROWTH), sessions[0].value),
+                      end_dates=end_dates,
+                      arrays={'close': close, 'adj_close': close, 'volume': np.ones_like(close)})
+
+
+def synthetic_backtest() -> VectorizedBacktest:
+    return VectorizedBacktest(synthetic_panel(), start=datetime(2016, 1, 1), end=datetime(2016, 12, 30))
+
+
+def momentum(**kwargs) -> Momentum:
+    parameters = {'momentum_gap': 0, 'ranking_period': 1, 'holding_period': 2,
+                  'losers_amount': 2, 'winners_amount': 2, 'filter_stocks': []}
+    parameters.update(kwargs)
+    return Momentum(**parameters)
+
+
+def test_rebalance_on_the_first_and_sell_before_the_last_session_of_a_month():
+    backtest = synthetic_backtest()
+    sessions = pd.Series(np.arange(len(backtest.ns)), index=backtest.panel.sessions)['2016']
+    months = sessions.groupby([sessions.index.month])
+
+    assert [day for day, kind in backtest.schedule if kind == REBALANCE] == months.first().tolist()
+    assert [day for day, kind in backtest.schedule if kind == SELL] == (months.last() - 1).tolist()
+    assert backtest.rebalance_days.tolist() == months.first().tolist()
+    assert backtest.first == sessions.iloc[0] and backtest.last == sessions.iloc[-1]
+
+
+def test_orders_fill_at_the_next_close_and_pay_commission():
+    backtest = synthetic_backtest()
+    day = backtest.first + 5
+    values = backtest.simulate({day: {0: 0.5}}, set())
+
+    price = backtest.prices[day, 0]
+    shares = np.trunc(0.5 * backtest.capital_base / price)
+    i = day - backtest.first
+    np.testing.assert_allclose(values[:i + 1], backtest.capital_base)
+    # Bought at the next close, valued at it: only the commission is lost that day
+    np.testing.assert_allclose(values[i + 1], backtest.capital_base - backtest.commission_per_share * shares)
+    np.testing.assert_allclose(values[i + 2] - values[i + 1],
+                               shares * (backtest.prices[day + 2, 0] - backtest.prices[day + 1, 0]))
+
+
+def test_positions_are_closed_the_session_after_the_last_trade():
+    backtest = synthetic_backtest()
+    auto_close = int(np.searchsorted(backtest.ns, DELISTED_AFTER.value, 'right'))
+    day = auto_close - 10
+    values = backtest.simulate({day: {DELISTED: 0.5}}, set())
+
+    i = auto_close - backtest.first
+    assert values[i - 1] != values[i - 2]
+    # Only cash is left from the auto close on
+    np.testing.assert_allclose(values[i:], values[i])
+
+    orders, _ = backtest.momentum_orders(momentum())
+    assert all(DELISTED not in targets for day, targets in orders.items() if day >= auto_close)
+
+
+def test_overlapping_tranches_are_netted_until_they_expire():
+    backtest = synthetic_backtest()
+    orders, liquidations = backtest.momentum_orders(momentum())
+    rebalances = backtest.rebalance_days.tolist()
+    sells = [day for day, kind in backtest.schedule if kind == SELL]
+
+    assert liquidations == set()
+    # Half of the equal weights in each of the two tranches
+    assert sorted(orders[rebalances[0]].items()) == [(0, -0.25), (1, -0.25), (6, 0.25), (7, 0.25)]
+    # Nothing expires after the first month, the second tranche doubles the weights
+    assert orders[sells[0]] == {}
+    np.testing.assert_allclose([orders[rebalances[1]][column] for column in [0, 1, 6, 7]], [-0.5, -0.5, 0.5, 0.5])
+    # The first tranche ends, its sids keep the second tranche's weight
+    np.testing.assert_allclose([orders[sells[1]][column] for column in [0, 1, 6, 7]], [-0.25, -0.25, 0.25, 0.25])
+
+
+def test_orders_match_a_ledger_replay_of_select():
+    backtest = synthetic_backtest()
+    strategy = momentum(ranking_period=3, holding_period=3, losers_amount=2, winners_amount=3)
+    orders, _ = backtest.momentum_orders(strategy)
+
+    first, last, _, _ = backtest.formation_returns([3], 0, 20)[3]
+    ledger = TrancheLedger(strategy.holding_period)
+    expected = {}
+    for day, kind in backtest.schedule:
+        if kind == REBALANCE:
+            i = backtest.rebalance_index[day]
+            if first[i] < 0:
+                continue
+            active = backtest.active(backtest.ns[first[i]], backtest.ns[last[i]])
+            returns = np.where(active, backtest.close[last[i]] / backtest.close[first[i]] - 1, np.nan)
+            losers, winners = select(returns, strategy.losers_amount, strategy.winners_amount)
+            columns = np.r_[losers, winners]
+            ledger.add(columns, np.r_[np.full(len(losers), -1 / 2), np.full(len(winners), 1 / 3)] / 3)
+        else:
+            columns = ledger.expire()
+        tradable = backtest.can_trade(day, columns)
+        expected[day] = dict(zip(columns[tradable], ledger.net(columns)[tradable]))
+
+    assert sorted(orders) == sorted(expected)
+    for day in expected:
+        assert sorted(orders[day]) == sorted(expected[day])
+        np.testing.assert_allclose([orders[day][c] for c in sorted(orders[day])],
+                                   [expected[day][c] for c in sorted(expected[day])])
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from utils.volatility import RollingVolatility, inverse_vol_weights
+
+
+def random_prices(rows=120, tickers=5, seed=7) -> np.ndarray:
+    random = np.random.RandomState(seed)
+    prices = 10 * np.exp(np.cumsum(random.normal(0, 0.02, (rows, tickers)), axis=0))
+    prices[40, 1] = np.nan
+    prices[90:, 3] = np.nan
+    return prices
+
+
+def test_window_volatility_matches_pandas_std():
+    prices = random_prices()
+    estimator = RollingVolatility.from_prices(prices)
+
+    for window, stop in [(20, 20), (20, 60), (61, 120), (3, 45), (120, 120)]:
+        frame = pd.DataFrame(prices[stop - window:stop])
+        # Per-call estimate of the window as TSMomentum used to compute it
+        expected = np.log(frame / frame.shift(1)).std()
+        expected[frame.isnull().any()] = np.nan
+        np.testing.assert_allclose(estimator.vol(window, stop), expected.values, rtol=1e-9)
+        np.testing.assert_allclose(estimator.vol(window, stop, annualization=242),
+                                   np.sqrt(242) * expected.values, rtol=1e-9)
+
+
+def test_appending_sessions_matches_building_at_once():
+    prices = random_prices()
+    estimator = RollingVolatility(prices.shape[1], capacity=4)
+    estimator.extend(prices[:30])
+    for row in prices[30:]:
+        estimator.append(row)
+
+    np.testing.assert_allclose(estimator.vol(50, 100), RollingVolatility.from_prices(prices).vol(50, 100))
+    assert estimator.missing[-1].tolist() == [0, 1, 0, 30, 0]
+
+
+def test_inverse_vol_weights_match_the_pandas_weights():
+    prices = random_prices()[-60:]
+    history = pd.DataFrame(prices, columns=list('ABCDE')).dropna(axis=1)
+
+    # The weights TSMomentum.rebalance computed with history.apply
+    vol = history.apply(lambda ts: np.sqrt(242 * np.log(ts / ts.shift(1)).var()), axis=0)
+    vol = vol.where(vol != 0).dropna()
+    inverse_vol = 0.4 / vol
+    expected = (inverse_vol / inverse_vol.sum()).fillna(0)
+
+    estimated = RollingVolatility.from_prices(history.values).vol(len(history), annualization=242)
+    weights = inverse_vol_weights(estimated, 0.4)
+    np.testing.assert_allclose(weights, expected.reindex(history.columns).values, rtol=1e-9)
+    assert np.isclose(weights.sum(), 1.0)
+
+
+def test_tickers_without_volatility_get_no_weight():
+    weights = inverse_vol_weights(np.array([0.1, np.nan, 0.0, 0.2]), 0.4)
+
+    np.testing.assert_allclose(weights, [2 / 3, 0.0, 0.0, 1 / 3])
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+import pandas as pd
+
+from walk_forward import make_folds
+
+
+def utc(date: str) -> pd.Timestamp:
+    return pd.Timestamp(date, tz='UTC')
+
+
+def test_rolling_folds_start_on_month_starts_and_chain_test_windows():
+    folds = make_folds(datetime(2012, 1, 3), datetime(2018, 12, 29), train_months=36, test_months=6)
+    assert len(folds) == 8
+    assert folds[0] == (utc('2012-01-01'), utc('2014-12-31'), utc('2015-01-01'), utc('2015-06-30'))
+    assert folds[1] == (utc('2012-07-01'), utc('2015-06-30'), utc('2015-07-01'), utc('2015-12-31'))
+    assert folds[-1][2:] == (utc('2018-07-01'), utc('2018-12-29'))
+    for previous, fold in zip(folds, folds[1:]):
+        assert fold[2] == previous[3] + pd.Timedelta(days=1)
+
+
+def test_anchored_folds_keep_the_first_train_start():
+    folds = make_folds(datetime(2012, 1, 3), datetime(2018, 12, 29), train_months=36, test_months=12, anchored=True)
+    assert [fold[0] for fold in folds] == [utc('2012-01-01')] * 4
+    assert [fold[1] for fold in folds] == [utc('2014-12-31'), utc('2015-12-31'), utc('2016-12-31'), utc('2017-12-31')]
@@ -0,0 +1,141 @@
+import argparse
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.price_panel import PricePanel, build_price_panel, open_price_panel
+from utils.universe import date_ns
+
+
+class ExclusionMask:
+    """
+    Tickers excluded from trading on every session, packed eight tickers
+    to a byte: one row of bits per session, one bit per panel column (sid order).
+    The row for a date is the last session on or before it, so a lookup
+    never sees data from after the date.
+    """
+
+    def __init__(self, sessions, tickers, bits: np.ndarray) -> None:
+        self.ns = np.asarray(sessions, dtype=np.int64)
+        self.tickers = np.asarray(tickers)
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self._order = np.argsort(self.tickers, kind='mergesort')
+        self._sorted = self.tickers[self._order]
+
+    @classmethod
+    def from_mask(cls, sessions, tickers, mask: np.ndarray) -> 'ExclusionMask':
+        return cls(sessions, tickers, np.packbits(np.asarray(mask, dtype=bool), axis=1))
+
+    @classmethod
+    def load(cls, path) -> 'ExclusionMask':
+        data = np.load(str(path))
+        return cls(data['sessions'], data['tickers'], data['bits'])
+
+    def save(self, path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(str(path), sessions=self.ns, tickers=self.tickers, bits=self.bits)
+
+    def row(self, date: datetime) -> np.ndarray:
+        # Excluded flags of all tickers in column order, nothing is excluded before the first session
+        index = int(np.searchsorted(self.ns, date_ns(date), 'right')) - 1
+        if index < 0:
+            return np.zeros(len(self.tickers), dtype=bool)
+        return np.unpackbits(self.bits[index])[:len(self.tickers)].astype(bool)
+
+    def mask(self, tickers, date: datetime) -> np.ndarray:
+        # Excluded flags for the given tickers; tickers unknown to the mask are kept
+        tickers = np.asarray(tickers)
+        if len(tickers) == 0 or len(self._sorted) == 0:
+            return np.zeros(len(tickers), dtype=bool)
+        position = np.minimum(np.searchsorted(self._sorted, tickers), len(self._sorted) - 1)
+        known = self._sorted[position] == tickers
+        return known & self.row(date)[self._order[position]]
+
+    def excluded(self, date: datetime) -> np.ndarray:
+        return self.tickers[self.row(date)]
+
+
+def run_lengths(flags: np.ndarray) -> np.ndarray:
+    # Length of the run of True values ending at every row, per column
+    rows = np.arange(len(flags))[:, None]
+    last_false = np.maximum.accumulate(np.where(flags, -1, rows), axis=0)
+    return rows - last_false
+
+
+def trailing_sum(values: np.ndarray, window: int) -> np.ndarray:
+    # Sum over the last `window` rows, including the current one
+    totals = np.vstack([np.zeros((1, values.shape[1]), dtype=np.int64), np.cumsum(values, axis=0)])
+    start = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    return totals[1:] - totals[start]
+
+
+def changepoint_counts(panel: PricePanel, changepoints: pd.DataFrame, window: int) -> np.ndarray:
+    # Changepoints per ticker over the last `window` sessions
+    events = np.zeros((len(panel.ns), len(panel.tickers)), dtype=np.int64)
+    if changepoints is not None and not changepoints.empty:
+        columns = changepoints['ticker'].map(panel.columns)
+        known = columns.notnull().values
+        rows = np.searchsorted(panel.ns, pd.to_datetime(changepoints['date']).values.astype(np.int64)[known], 'left')
+        rows = np.minimum(rows, len(panel.ns) - 1)
+        np.add.at(events, (rows, columns.values[known].astype(np.int64)), 1)
+
+    return trailing_sum(events, window)
+
+
+def build_exclusions(panel: PricePanel,
+                     changepoints: pd.DataFrame = None,
+                     window=242,
+                     max_stale_run=5,
+                     max_zero_volume_run=5,
+                     max_changepoints=5) -> ExclusionMask:
+    """
+    A ticker is excluded on a session when, within the last `window` sessions,
+    - its bar was carried forward (same close and volume as the day before,
+      the bundle forward-fills missing days) more than max_stale_run days in a row,
+    - it traded no volume more than max_zero_volume_run days in a row,
+    - or it had more than max_changepoints changepoints (changepoints.py table).
+    Changepoints are dated where they occur but are detected over the scanned range.
+    """
+    close = np.asarray(panel.close)
+    volume = np.asarray(panel.volume)
+
+    stale = np.zeros(close.shape, dtype=bool)
+    stale[1:] = (close[1:] == close[:-1]) & (volume[1:] == volume[:-1])
+    zero_volume = volume == 0
+
+    excluded = trailing_sum(run_lengths(stale) > max_stale_run, window) > 0
+    excluded |= trailing_sum(run_lengths(zero_volume) > max_zero_volume_run, window) > 0
+    excluded |= changepoint_counts(panel, changepoints, window) > max_changepoints
+
+    return ExclusionMask.from_mask(panel.ns, panel.tickers, excluded)
+
+
+@lru_cache(maxsize=None)
+def open_exclusions(path) -> ExclusionMask:
+    return ExclusionMask.load(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Data-quality exclusions of the bundle tickers')
+    parser.add_argument('--bundle', default='database_bundle2')
+    parser.add_argument('--changepoints', default='data/changepoints/changepoints.csv')
+    parser.add_argument('--out', default='data/exclusions.npz')
+    parser.add_argument('--window', type=int, default=242)
+    parser.add_argument('--max-stale-run', type=int, default=5)
+    parser.add_argument('--max-zero-volume-run', type=int, default=5)
+    parser.add_argument('--max-changepoints', type=int, default=5)
+    args = parser.parse_args()
+
+    panel = open_price_panel(str(build_price_panel(args.bundle)))
+    changepoints = pd.read_csv(args.changepoints, parse_dates=['date']) if Path(args.changepoints).exists() else None
+    exclusions = build_exclusions(panel,
+                                  changepoints,
+                                  window=args.window,
+                                  max_stale_run=args.max_stale_run,
+                                  max_zero_volume_run=args.max_zero_volume_run,
+                                  max_changepoints=args.max_changepoints)
+    exclusions.save(args.out)
+    print('Excluded on the last session: {}'.format(', '.join(exclusions.excluded(pd.Timestamp(panel.ns[-1])))))
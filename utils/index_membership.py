@@ -0,0 +1,57 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils.get_available_assets import get_universe
+from utils.universe import date_ns
+
+
+class IndexMembership:
+    """
+    Index members parsed once from a filter file (a date column and a
+    ';'-joined ticker list per date): sorted dates and one boolean row
+    over the ticker vocabulary per date. The members for a date are
+    those of the last row strictly before it, or of the first row
+    when the date precedes the file.
+    """
+
+    def __init__(self, dates, tickers, masks: np.ndarray) -> None:
+        self.ns = np.asarray(dates, dtype=np.int64)
+        self.tickers = np.asarray(tickers)
+        self.masks = np.asarray(masks, dtype=bool)
+
+    @classmethod
+    def from_csv(cls, path, known_tickers=None) -> 'IndexMembership':
+        df = pd.read_csv(path, parse_dates=['date'], index_col='date').sort_index(kind='mergesort')
+        members = [str(value).split(';') for value in df.iloc[:, 0]]
+
+        tickers = np.unique(np.concatenate([np.asarray(m) for m in members])) if members else np.array([])
+        if known_tickers is not None:
+            tickers = tickers[np.in1d(tickers, np.asarray(known_tickers))]
+
+        masks = np.zeros((len(members), len(tickers)), dtype=bool)
+        for row, names in enumerate(members):
+            masks[row] = np.in1d(tickers, names)
+        return cls(df.index.values.astype('datetime64[ns]').view(np.int64), tickers, masks)
+
+    def row(self, date: datetime) -> np.ndarray:
+        index = max(int(np.searchsorted(self.ns, date_ns(date), 'left')) - 1, 0)
+        return self.masks[index]
+
+    def members(self, date: datetime) -> np.ndarray:
+        return self.tickers[self.row(date)]
+
+    def contains(self, tickers, date: datetime) -> np.ndarray:
+        tickers = np.asarray(tickers)
+        if len(tickers) == 0 or len(self.tickers) == 0:
+            return np.zeros(len(tickers), dtype=bool)
+        position = np.minimum(np.searchsorted(self.tickers, tickers), len(self.tickers) - 1)
+        return (self.tickers[position] == tickers) & self.row(date)[position]
+
+
+@lru_cache(maxsize=None)
+def open_membership(path) -> IndexMembership:
+    # Parsed once per process; tickers missing from equity_history are dropped like before
+    return IndexMembership.from_csv(path, get_universe().tickers)
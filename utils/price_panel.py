@@ -0,0 +1,148 @@
+import json
+import sys
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.sessions import get_session_calendar
+
+
+class PricePanel:
+    """
+    Dates x tickers float64 price arrays of a bundle, one .npy file per field.
+    Opened memory-mapped, so every process reading the same panel shares one
+    physical copy through the page cache and row windows are views.
+
+    close and volume are the raw bars, adj_close has the bundle's splits and
+    dividends applied backwards like zipline's history does.
+    """
+
+    fields = ('close', 'adj_close', 'volume')
+
+    def __init__(self, sessions, tickers, start_dates, end_dates, arrays: dict) -> None:
+        self.ns = np.asarray(sessions, dtype=np.int64)
+        self.sessions = pd.DatetimeIndex(self.ns, tz='UTC')
+        self.tickers = np.asarray(tickers)
+        self.start_dates = np.asarray(start_dates, dtype=np.int64)
+        self.end_dates = np.asarray(end_dates, dtype=np.int64)
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        for field in self.fields:
+            setattr(self, field, arrays[field])
+
+    @classmethod
+    def from_bundle(cls, bundle_data) -> 'PricePanel':
+        finder = bundle_data.asset_finder
+        equities = sorted(finder.retrieve_all(finder.sids), key=lambda e: e.sid)
+        sids = [e.sid for e in equities]
+
+        reader = bundle_data.equity_daily_bar_reader
+        sessions = reader.sessions
+        close, volume = reader.load_raw_arrays(['close', 'volume'], sessions[0], sessions[-1], sids)
+        close = np.asarray(close, dtype=np.float64)
+
+        return cls(sessions=sessions.asi8,
+                   tickers=np.array([e.symbol for e in equities]),
+                   start_dates=[e.start_date.value for e in equities],
+                   end_dates=[e.end_date.value for e in equities],
+                   arrays={
+                       'close': close,
+                       'adj_close': adjust(close, sessions, sids, bundle_data.adjustment_reader),
+                       'volume': np.asarray(volume, dtype=np.float64)
+                   })
+
+    @classmethod
+    def load(cls, path, mmap_mode='r') -> 'PricePanel':
+        path = Path(path)
+        meta = np.load(str(path / 'meta.npz'))
+        arrays = {field: np.load(str(path / '{}.npy'.format(field)), mmap_mode=mmap_mode) for field in cls.fields}
+        return cls(meta['sessions'], meta['tickers'], meta['start_dates'], meta['end_dates'], arrays)
+
+    def save(self, path) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.savez(str(path / 'meta.npz'),
+                 sessions=self.ns,
+                 tickers=self.tickers,
+                 start_dates=self.start_dates,
+                 end_dates=self.end_dates)
+        for field in self.fields:
+            np.save(str(path / '{}.npy'.format(field)), np.ascontiguousarray(getattr(self, field)))
+        with (path / 'panel.json').open('w') as f:
+            json.dump({'sessions': len(self.ns), 'tickers': len(self.tickers)}, f)
+
+    def rows(self, end_date: datetime, bar_count: int) -> (int, int):
+        stop = int(np.searchsorted(self.ns, pd.Timestamp(end_date).value, 'right'))
+        return stop - bar_count, stop
+
+    def window(self, field: str, end_date: datetime, bar_count: int) -> np.ndarray:
+        # A view on the last bar_count sessions up to end_date, no copy
+        start, stop = self.rows(end_date, bar_count)
+        return getattr(self, field)[max(start, 0):stop]
+
+    def history(self, assets, field: str, bar_count: int, end_date: datetime) -> pd.DataFrame:
+        """
+        Same frame as data.history(assets, field, bar_count, '1d'):
+        sessions as index and the given assets as columns.
+        Only the requested columns of the window are gathered.
+        """
+        start, stop = self.rows(end_date, bar_count)
+        columns = [self.columns.get(asset.symbol, -1) for asset in assets]
+        window = self.window(field, end_date, bar_count)
+
+        values = np.full((window.shape[0], len(columns)), np.nan)
+        known = np.array([c >= 0 for c in columns], dtype=bool)
+        values[:, known] = window[:, [c for c in columns if c >= 0]]
+        df = pd.DataFrame(values, index=self.sessions[max(start, 0):stop], columns=assets)
+
+        if start < 0:
+            # Sessions before the panel come back empty, as they do from zipline
+            df = df.reindex(get_session_calendar('XMOS').sessions_back(end_date, bar_count))
+        return df
+
+
+def adjust(close: np.ndarray, sessions: pd.DatetimeIndex, sids, adjustment_reader) -> np.ndarray:
+    adjusted = close.copy()
+    if adjustment_reader is None:
+        return adjusted
+
+    columns = {sid: i for i, sid in enumerate(sids)}
+    for table in ['splits', 'mergers', 'dividends']:
+        adjustments = pd.read_sql_query('select sid, effective_date, ratio from {}'.format(table),
+                                        adjustment_reader.conn)
+        effective = pd.to_datetime(adjustments['effective_date'], unit='s').values.astype(np.int64)
+        rows = np.searchsorted(sessions.asi8, effective, 'left')
+        for sid, row, ratio in zip(adjustments['sid'], rows, adjustments['ratio']):
+            if sid in columns:
+                # Prices before the effective date are scaled by the ratio
+                adjusted[:row, columns[sid]] *= ratio
+    return adjusted
+
+
+def panel_path(bundle: str) -> Path:
+    # Stored inside the bundle's most recent ingestion, so a new ingest never reads a stale panel
+    from zipline.data.bundles.core import most_recent_data
+
+    return Path(most_recent_data(bundle, pd.Timestamp.utcnow())) / 'price_panel'
+
+
+def build_price_panel(bundle: str) -> Path:
+    from zipline.data.bundles import load
+
+    path = panel_path(bundle)
+    if not (path / 'panel.json').exists():
+        PricePanel.from_bundle(load(bundle)).save(path)
+    return path
+
+
+@lru_cache(maxsize=None)
+def open_price_panel(path) -> PricePanel:
+    # One mapping per process, shared by every strategy run in it
+    return PricePanel.load(path)
+
+
+if __name__ == "__main__":
+    # python -m utils.price_panel database_bundle2
+    print(build_price_panel(sys.argv[1] if len(sys.argv) > 1 else 'database_bundle2'))
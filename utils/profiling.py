@@ -0,0 +1,119 @@
+import cProfile
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+"""
+Opt-in timers and counters for the strategy hot paths. Disabled, a
+profiled function costs one attribute check per call. Enable with
+STRATEGY_PROFILE=1 in the environment (inherited by pool workers) or
+profiler.enable(); main.py --profile does both and writes one JSON
+report per run to data/profile.
+"""
+
+
+class Profiler:
+    def __init__(self, enabled=False) -> None:
+        self.enabled = enabled
+        self.timings = {}
+        self.counters = {}
+        self._listening = False
+
+    def enable(self) -> None:
+        self.enabled = True
+        self._listen_sql()
+
+    def reset(self) -> None:
+        self.timings = {}
+        self.counters = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.timings.setdefault(stage, []).append(seconds)
+
+    def count(self, name: str, value=1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, stage: str):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def report(self) -> dict:
+        stages = {}
+        for stage, timings in self.timings.items():
+            timings = np.asarray(timings)
+            stages[stage] = {
+                'calls': len(timings),
+                'total': float(timings.sum()),
+                'mean': float(timings.mean()),
+                'p50': float(np.percentile(timings, 50)),
+                'p99': float(np.percentile(timings, 99)),
+                'max': float(timings.max())
+            }
+        return {'stages': stages, 'counters': dict(self.counters)}
+
+    def dump(self, path, **fields) -> None:
+        report = self.report()
+        report.update(fields)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(str(path), 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    def _listen_sql(self) -> None:
+        # Every statement sent to any engine is a round-trip
+        if self._listening:
+            return
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self.count('sql_round_trips')
+
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        self._listening = True
+
+
+profiler = Profiler()
+if os.environ.get('STRATEGY_PROFILE') == '1':
+    profiler.enable()
+
+
+def profiled(stage: str):
+    # Times every call of the decorated function under stage when profiling is enabled
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def capture(path):
+    # cProfile of one run, the stats file opens with pstats or snakeviz
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(str(path))
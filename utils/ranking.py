@@ -0,0 +1,73 @@
+import numpy as np
+
+"""
+Cross-sectional selection of momentum losers and winners.
+A full sort of the formation returns is replaced by a partial sort
+(argpartition) of the N candidates at each end; only those are sorted.
+Tickers with a NaN return are never selected.
+"""
+
+LOSER_THRESHOLD = 0.0
+WINNER_THRESHOLD = 0.01
+
+
+def formation_returns(first_prices, last_prices) -> np.ndarray:
+    # Cumulative return over the formation window from its first and last price rows
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.asarray(last_prices, dtype=np.float64) / np.asarray(first_prices, dtype=np.float64) - 1
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def bottom(values: np.ndarray, n: int, below=LOSER_THRESHOLD) -> np.ndarray:
+    # Positions of the n smallest values under `below`, in ascending order of value
+    eligible = np.flatnonzero(values < below)
+    if n <= 0:
+        return eligible[:0]
+    if len(eligible) > n:
+        eligible = eligible[np.argpartition(values[eligible], n - 1)[:n]]
+    return eligible[np.argsort(values[eligible], kind='mergesort')]
+
+
+def top(values: np.ndarray, n: int, above=WINNER_THRESHOLD) -> np.ndarray:
+    # Positions of the n largest values over `above`, in ascending order of value
+    eligible = np.flatnonzero(values > above)
+    if n <= 0:
+        return eligible[:0]
+    if len(eligible) > n:
+        eligible = eligible[np.argpartition(-values[eligible], n - 1)[:n]]
+    return eligible[np.argsort(values[eligible], kind='mergesort')]
+
+
+def select(returns, losers_amount: int, winners_amount: int) -> (np.ndarray, np.ndarray):
+    """
+    Losers: the losers_amount most negative returns.
+    Winners: the winners_amount highest returns above 1%.
+    Same picks as slicing the sorted returns in Momentum.rebalance.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return bottom(returns, losers_amount), top(returns, winners_amount)
+
+
+def select_batch(returns, amounts) -> dict:
+    """
+    Selections for every row of a (ranking periods x tickers) returns
+    matrix and every (losers_amount, winners_amount) pair, keyed by
+    (row, losers_amount, winners_amount). Each row is partitioned once
+    for the largest amounts, smaller ones are prefixes of it.
+    """
+    returns = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+    amounts = list(amounts)
+    most_losers = max([losers for losers, _ in amounts] or [0])
+    most_winners = max([winners for _, winners in amounts] or [0])
+
+    selections = {}
+    for row, values in enumerate(returns):
+        losers, winners = select(values, most_losers, most_winners)
+        for losers_amount, winners_amount in amounts:
+            selections[(row, losers_amount, winners_amount)] = (
+                losers[:max(losers_amount, 0)],
+                winners[len(winners) - min(max(winners_amount, 0), len(winners)):]
+            )
+    return selections
@@ -0,0 +1,182 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+"""
+Strategy results stored under a hash of everything that determines them:
+the source of every project module the strategy class depends on, the
+constructor parameters, the simulated date range and the bundle ingestion.
+A changed parameter or an edit to the strategy or to a helper it uses
+(ranking, tranches, volatility, ...) gets a new key, so only the affected
+runs are simulated again. Entries are hard links to the results, they take
+no extra disk space. Past a size or entry limit the least recently used
+entries are evicted together with the results in data/out linked to them,
+otherwise the shared blocks would stay on disk and the limit would bound nothing.
+"""
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def project_module(name: str):
+    # The loaded module if its file is part of this project, None for the standard library and packages
+    module = sys.modules.get(name)
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return None
+    path = Path(path).resolve()
+    if PROJECT_ROOT not in path.parents or 'site-packages' in path.parts:
+        return None
+    return module
+
+
+def module_dependencies(name: str) -> list:
+    # Project modules reachable from a module through its top-level imports, sorted by name
+    seen = set()
+    pending = [name]
+    while pending:
+        module = project_module(pending.pop())
+        if module is None or module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+        for value in vars(module).values():
+            pending.append(value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None) or '')
+    return sorted(seen)
+
+
+def class_source(cls) -> str:
+    # Source of the module defining the class and of every project module it imports
+    sources = []
+    for name in module_dependencies(cls.__module__):
+        try:
+            sources.append(inspect.getsource(sys.modules[name]))
+        except (OSError, TypeError):
+            sources.append(name)
+    return '\n'.join(sources)
+
+
+def parameter_value(value):
+    # Files named by a parameter (filter_file, exclusions) are keyed by their content
+    if isinstance(value, str) and os.path.isfile(value):
+        with open(value, 'rb') as f:
+            return 'sha1:' + hashlib.sha1(f.read()).hexdigest()
+    if isinstance(value, (list, tuple, set)):
+        return sorted(parameter_value(v) for v in value)
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+def strategy_parameters(strategy) -> dict:
+    names = [name for name in inspect.signature(type(strategy).__init__).parameters if name != 'self']
+    return {name: parameter_value(getattr(strategy, name, None)) for name in names}
+
+
+def bundle_fingerprint(bundle: str) -> str:
+    # The directory of the most recent ingestion is named after its timestamp
+    import pandas as pd
+    from zipline.data.bundles.core import most_recent_data
+
+    return '{}/{}'.format(bundle, Path(most_recent_data(bundle, pd.Timestamp.utcnow())).name)
+
+
+def cache_key(strategy, start: datetime, end: datetime, bundle: str) -> str:
+    payload = json.dumps({
+        'class': type(strategy).__name__,
+        'source': class_source(type(strategy)),
+        'parameters': strategy_parameters(strategy),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bundle': bundle
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root='data/cache', max_bytes=None, max_entries=None, outputs='data/out') -> None:
+        self.root = Path(root)
+        self.outputs = Path(outputs)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / '{}.h5'.format(key)
+
+    def get(self, key: str, target: Path) -> bool:
+        # Links the cached result to target and marks it as recently used
+        path = self.path(key)
+        if not path.exists():
+            return False
+        os.utime(str(path), None)
+        Path(target).parent.mkdir(parents=True, exist_ok=True)
+        share(path, Path(target))
+        return True
+
+    def put(self, key: str, source: Path) -> None:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        share(Path(source), path)
+
+    def entries(self) -> list:
+        # (last used, size, path) of every entry, least recently used first
+        entries = []
+        for path in self.root.glob('*/*.h5'):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def linked_outputs(self) -> dict:
+        # Results in the outputs directory by (device, inode), the files sharing it with a cache entry
+        outputs = {}
+        for path in self.outputs.glob('**/*.h5'):
+            stat = path.stat()
+            outputs.setdefault((stat.st_dev, stat.st_ino), []).append(path)
+        return outputs
+
+    def evict(self, keep=()) -> int:
+        """
+        Removes least recently used entries and the results linked to them
+        until the limits hold, except the keys in keep (the current run).
+        Returns the number of removed results.
+        """
+        keep = set(keep)
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        candidates = [entry for entry in entries if entry[2].stem not in keep]
+        outputs = None
+        removed = 0
+        while candidates and ((self.max_bytes is not None and total > self.max_bytes) or
+                              (self.max_entries is not None and count > self.max_entries)):
+            _, size, path = candidates.pop(0)
+            stat = path.stat()
+            if stat.st_nlink > 1:
+                outputs = self.linked_outputs() if outputs is None else outputs
+                for output in outputs.get((stat.st_dev, stat.st_ino), []):
+                    output.unlink()
+                    removed += 1
+            path.unlink()
+            total -= size
+            count -= 1
+        return removed
+
+
+def share(source: Path, target: Path) -> None:
+    """
+    Hard links source to target, copying only across file systems. Linked
+    next to the target first, so a reader never sees a partial file.
+    ResultsStore.write replaces files instead of truncating them, so a
+    rewritten result never changes the cached entry it was linked from.
+    """
+    partial = target.with_name(target.name + '.partial')
+    if partial.exists():
+        partial.unlink()
+    try:
+        os.link(str(source), str(partial))
+    except OSError:
+        shutil.copyfile(str(source), str(partial))
+    os.replace(str(partial), str(target))
@@ -0,0 +1,121 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+"""
+Per-strategy results in compressed HDF5 files (PyTables, blosc):
+<root>/<group>/<strategy id>.h5 with a table of the scalar daily
+perf columns and normalized positions and transactions tables.
+One file per strategy lets pool workers write concurrently.
+"""
+
+POSITION_FIELDS = ['amount', 'cost_basis', 'last_sale_price']
+TRANSACTION_FIELDS = ['dt', 'amount', 'price', 'commission', 'order_id']
+
+
+class ResultsStore:
+    def __init__(self, root='data/out', complevel=9, complib='blosc') -> None:
+        self.root = Path(root)
+        self.complevel = complevel
+        self.complib = complib
+
+    def path(self, group: str, strategy_id: str) -> Path:
+        return self.root / group / '{}.h5'.format(strategy_id)
+
+    def exists(self, group: str, strategy_id: str) -> bool:
+        return self.path(group, strategy_id).exists()
+
+    def strategies(self, group: str = None) -> list:
+        pattern = '*/*.h5' if group is None else '{}/*.h5'.format(group)
+        return sorted((p.parent.name, p.stem) for p in self.root.glob(pattern))
+
+    def write(self, group: str, strategy_id: str, perf: pd.DataFrame) -> Path:
+        path = self.path(group, strategy_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A new file, the old one may be hard linked from the result cache
+        if path.exists():
+            path.unlink()
+        if isinstance(perf, pd.Series):
+            perf = perf.to_frame('returns')
+
+        tables = {'daily': scalar_columns(perf)}
+        if 'positions' in perf.columns:
+            tables['positions'] = normalize(perf['positions'], POSITION_FIELDS)
+        if 'transactions' in perf.columns:
+            tables['transactions'] = normalize(perf['transactions'], TRANSACTION_FIELDS)
+
+        with pd.HDFStore(str(path), mode='w', complevel=self.complevel, complib=self.complib) as store:
+            for key, df in tables.items():
+                store.put(key, df, format='table', data_columns=True)
+        return path
+
+    def read(self, group: str, strategy_id: str, key='daily', columns=None, start=None, end=None) -> pd.DataFrame:
+        # start and end are resolved by name inside the where expressions
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        where = []
+        if start is not None:
+            where.append('index >= start' if key == 'daily' else 'date >= start')
+        if end is not None:
+            where.append('index <= end' if key == 'daily' else 'date <= end')
+        with pd.HDFStore(str(self.path(group, strategy_id)), mode='r') as store:
+            if key not in store:
+                return pd.DataFrame(columns=columns)
+            return store.select(key, where=where or None, columns=columns)
+
+    def daily(self, column='returns', group: str = None, strategy_ids=None, start=None, end=None) -> pd.DataFrame:
+        """
+        One daily column for many strategies, as a dates x strategy ids frame,
+        or dates x (group, strategy id) without a group: the same id can be
+        stored in several groups. Only that column is returned, PyTables still
+        reads whole rows of each daily table, which holds the scalar columns only.
+        """
+        frames = {}
+        for strategy_group, strategy_id in self.strategies(group):
+            if strategy_ids is not None and strategy_id not in strategy_ids:
+                continue
+            key = strategy_id if group is not None else (strategy_group, strategy_id)
+            frames[key] = self.read(strategy_group, strategy_id, 'daily', [column], start, end)[column]
+        return pd.DataFrame(frames)
+
+    def returns(self, group: str = None, strategy_ids=None, start=None, end=None) -> pd.DataFrame:
+        return self.daily('returns', group, strategy_ids, start, end)
+
+    def positions(self, group: str, strategy_id: str, start=None, end=None) -> pd.DataFrame:
+        return self.read(group, strategy_id, 'positions', start=start, end=end)
+
+    def transactions(self, group: str, strategy_id: str, start=None, end=None) -> pd.DataFrame:
+        return self.read(group, strategy_id, 'transactions', start=start, end=end)
+
+
+def scalar_columns(perf: pd.DataFrame) -> pd.DataFrame:
+    # Keeps numeric and datetime columns; object columns holding lists (positions, orders...) are dropped
+    columns = {}
+    for column in perf.columns:
+        series = perf[column]
+        if series.dtype != object:
+            columns[column] = series
+        elif not series.dropna().map(lambda v: isinstance(v, (list, dict))).any():
+            columns[column] = pd.to_numeric(series, errors='coerce')
+    return pd.DataFrame(columns, index=perf.index, columns=[c for c in perf.columns if c in columns])
+
+
+def normalize(entries: pd.Series, fields: list) -> pd.DataFrame:
+    # One row per (date, asset) from the per-day lists of dicts zipline returns
+    rows = []
+    for date, items in entries.items():
+        for item in items or []:
+            asset = item['sid']
+            row = {'date': date, 'sid': int(getattr(asset, 'sid', asset)), 'symbol': getattr(asset, 'symbol', '')}
+            for field in fields:
+                row[field] = item.get(field)
+            rows.append(row)
+
+    df = pd.DataFrame(rows, columns=['date', 'sid', 'symbol'] + fields)
+    if 'order_id' in df.columns:
+        df['order_id'] = df['order_id'].astype(str)
+    for field in fields:
+        if field not in ('dt', 'order_id'):
+            df[field] = df[field].astype(np.float64)
+    return df
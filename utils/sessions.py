@@ -0,0 +1,52 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+class SessionCalendar:
+    """
+    Session labels of a trading calendar held as a sorted int64 array.
+    Range, count and lookback queries are binary searches, and the
+    bounds of recently requested ranges are kept in an LRU cache.
+    """
+
+    def __init__(self, sessions: pd.DatetimeIndex, cache_size=1024) -> None:
+        self.sessions = sessions
+        self.ns = sessions.asi8
+        self._bounds = lru_cache(maxsize=cache_size)(self._search)
+
+    def _search(self, first_ns: int, last_ns: int) -> (int, int):
+        return int(np.searchsorted(self.ns, first_ns, 'left')), int(np.searchsorted(self.ns, last_ns, 'right'))
+
+    def bounds(self, first_date: datetime, last_date: datetime) -> (int, int):
+        return self._bounds(pd.Timestamp(first_date).value, pd.Timestamp(last_date).value)
+
+    def sessions_in_range(self, first_date: datetime, last_date: datetime) -> pd.DatetimeIndex:
+        start, stop = self.bounds(first_date, last_date)
+        return self.sessions[start:stop]
+
+    def count(self, first_date: datetime, last_date: datetime) -> int:
+        start, stop = self.bounds(first_date, last_date)
+        return max(stop - start, 0)
+
+    def sessions_back(self, last_date: datetime, count: int) -> pd.DatetimeIndex:
+        # The last `count` sessions on or before last_date
+        stop = int(np.searchsorted(self.ns, pd.Timestamp(last_date).value, 'right'))
+        return self.sessions[max(stop - count, 0):stop]
+
+    def session_on_or_before(self, dt: datetime) -> pd.Timestamp:
+        stop = int(np.searchsorted(self.ns, pd.Timestamp(dt).value, 'right'))
+        return self.sessions[stop - 1] if stop > 0 else None
+
+    def session_on_or_after(self, dt: datetime) -> pd.Timestamp:
+        start = int(np.searchsorted(self.ns, pd.Timestamp(dt).value, 'left'))
+        return self.sessions[start] if start < len(self.ns) else None
+
+
+@lru_cache(maxsize=None)
+def get_session_calendar(name='XMOS') -> SessionCalendar:
+    from trading_calendars import get_calendar
+
+    return SessionCalendar(get_calendar(name).all_sessions)
@@ -1,19 +1,25 @@
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
-from trading_calendars import get_calendar
+
+from utils.sessions import get_session_calendar
 
 
 def volatility(ts, vola_window):
-    return ts.pct_change().rolling(vola_window).std().iloc[-1]
+    # Standard deviation of the last vola_window returns, same as rolling(vola_window).std().iloc[-1]
+    returns = ts.pct_change().iloc[-vola_window:]
+    if len(returns) < vola_window or returns.isnull().any():
+        return np.nan
+    return returns.std()
 
 
 def cumulative_returns(ts: pd.Series, first_date: datetime, last_date: datetime) -> pd.Series:
-    new_ts = pd.Series([ts[first_date], ts[last_date]])
-    r = new_ts.pct_change()
-    r = r[1]
-    return r
+    calendar = get_session_calendar('XMOS')
+    first_date = calendar.session_on_or_after(first_date)
+    last_date = calendar.session_on_or_before(last_date)
+    return ts[last_date] / ts[first_date] - 1
 
 
 def sessions_in_range(first_date: datetime, last_date: datetime) -> pd.DatetimeIndex:
-    return get_calendar('XMOS').sessions_in_range(first_date, last_date)
+    return get_session_calendar('XMOS').sessions_in_range(first_date, last_date)
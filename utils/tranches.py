@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class TrancheLedger:
+    """
+    Overlapping holding portfolios of a momentum strategy: one slot per
+    tranche, each holding the sids bought at one rebalance with their
+    target weights and its age in holding months. A tranche expires
+    when its age reaches the holding period. The target of a sid is the
+    sum of its weights over all live tranches, so overlapping tranches
+    are netted into one order per security.
+    """
+
+    def __init__(self, holding_period: int, capacity=32) -> None:
+        self.holding_period = holding_period
+        self.sids = np.full((holding_period, capacity), -1, dtype=np.int64)
+        self.weights = np.zeros((holding_period, capacity))
+        # 0 marks a free slot
+        self.ages = np.zeros(holding_period, dtype=np.int64)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.ages))
+
+    def _grow(self, slots: int, capacity: int) -> None:
+        sids = np.full((slots, capacity), -1, dtype=np.int64)
+        weights = np.zeros((slots, capacity))
+        ages = np.zeros(slots, dtype=np.int64)
+        rows, columns = self.sids.shape
+        sids[:rows, :columns] = self.sids
+        weights[:rows, :columns] = self.weights
+        ages[:rows] = self.ages
+        self.sids, self.weights, self.ages = sids, weights, ages
+
+    def add(self, sids, weights) -> None:
+        sids = np.asarray(sids, dtype=np.int64)
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), sids.shape)
+
+        free = np.flatnonzero(self.ages == 0)
+        slots, capacity = self.sids.shape
+        if len(free) == 0 or len(sids) > capacity:
+            self._grow(slots + (len(free) == 0), max(capacity, len(sids)))
+            free = np.flatnonzero(self.ages == 0)
+
+        slot = free[0]
+        self.sids[slot] = -1
+        self.weights[slot] = 0.0
+        self.sids[slot, :len(sids)] = sids
+        self.weights[slot, :len(sids)] = weights
+        self.ages[slot] = 1
+
+    def expire(self) -> np.ndarray:
+        """
+        Ends the tranches that reached the holding period and ages the others.
+        Returns the sids of the ended tranches, whose targets have to be updated.
+        """
+        expiring = self.ages == self.holding_period
+        expired = self.sids[expiring]
+        self.sids[expiring] = -1
+        self.weights[expiring] = 0.0
+        self.ages[expiring] = 0
+        self.ages[self.ages > 0] += 1
+        return np.unique(expired[expired >= 0])
+
+    def targets(self) -> (np.ndarray, np.ndarray):
+        # Net target weight of every held sid, sids sorted
+        live = self.sids >= 0
+        if not live.any():
+            return np.array([], dtype=np.int64), np.array([])
+        sids, inverse = np.unique(self.sids[live], return_inverse=True)
+        return sids, np.bincount(inverse, weights=self.weights[live])
+
+    def net(self, sids) -> np.ndarray:
+        # Net target weights of the given sids, 0 for sids no tranche holds
+        sids = np.asarray(sids, dtype=np.int64)
+        held, weights = self.targets()
+        if len(held) == 0:
+            return np.zeros(len(sids))
+        position = np.minimum(np.searchsorted(held, sids), len(held) - 1)
+        return np.where(held[position] == sids, weights[position], 0.0)
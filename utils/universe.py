@@ -0,0 +1,81 @@
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.db import read_query
+
+universe_query = """select ticker,
+                    min(trade_date) as first_date,
+                    max(trade_date) as last_date
+                    from equity_history
+                    group by ticker
+                    order by ticker"""
+
+
+class AssetUniverse:
+    """
+    Point-in-time asset universe built from the first and last
+    trade date of every ticker. A ticker is active in [first, last]
+    if its trading interval overlaps it, so gaps inside a ticker's
+    history are not taken into account.
+    """
+
+    def __init__(self, tickers, first_dates, last_dates) -> None:
+        order = np.argsort(np.asarray(tickers), kind='mergesort')
+        self.tickers = np.asarray(tickers)[order]
+        self.first_dates = to_ns(first_dates)[order]
+        self.last_dates = to_ns(last_dates)[order]
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'AssetUniverse':
+        return cls(df['ticker'].values, df['first_date'].values, df['last_date'].values)
+
+    @classmethod
+    def from_sql(cls, con) -> 'AssetUniverse':
+        return cls.from_frame(read_query(universe_query, con, parse_dates=['first_date', 'last_date']))
+
+    @classmethod
+    def from_csv(cls, path) -> 'AssetUniverse':
+        return cls.from_frame(pd.read_csv(path, parse_dates=['first_date', 'last_date']))
+
+    def to_csv(self, path) -> None:
+        pd.DataFrame({
+            'ticker': self.tickers,
+            'first_date': pd.to_datetime(self.first_dates),
+            'last_date': pd.to_datetime(self.last_dates)
+        }, columns=['ticker', 'first_date', 'last_date']).to_csv(path, index=False)
+
+    def active_mask(self, first_date: datetime = None, last_date: datetime = None) -> np.ndarray:
+        mask = np.ones(len(self.tickers), dtype=bool)
+        if last_date is not None:
+            mask &= self.first_dates <= date_ns(last_date)
+        if first_date is not None:
+            mask &= self.last_dates >= date_ns(first_date)
+        return mask
+
+    def active(self, first_date: datetime = None, last_date: datetime = None) -> np.ndarray:
+        return self.tickers[self.active_mask(first_date, last_date)]
+
+
+def to_ns(dates) -> np.ndarray:
+    return pd.to_datetime(dates).values.astype('datetime64[ns]').view(np.int64)
+
+
+def date_ns(dt: datetime) -> int:
+    # Trade dates carry no timezone, session labels are midnight UTC
+    ts = pd.Timestamp(dt)
+    if ts.tz is not None:
+        ts = ts.tz_convert(None)
+    return ts.value
+
+
+if __name__ == "__main__":
+    # Dump the universe for offline runs: python -m utils.universe data/universe.csv
+    from utils.db import get_engine
+
+    AssetUniverse.from_sql(get_engine()).to_csv(sys.argv[1])
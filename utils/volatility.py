@@ -0,0 +1,194 @@
+from functools import lru_cache
+
+import numpy as np
+
+from utils.price_panel import open_price_panel
+
+
+class RollingVolatility:
+    """
+    Prefix sums of daily log returns and squared log returns for every ticker,
+    appended one session at a time in O(tickers). The variance over any window
+    of sessions then costs two subtractions per ticker, whatever the window length.
+    """
+
+    def __init__(self, n_assets: int, capacity=512) -> None:
+        self.n_assets = n_assets
+        self.count = 0
+        self._last = None
+        # _sums[k]: sum over the returns ending at rows 1..k, _missing[k]: missing prices in rows 0..k-1
+        self._sums = np.zeros((capacity, n_assets))
+        self._sq_sums = np.zeros((capacity, n_assets))
+        self._missing = np.zeros((capacity + 1, n_assets), dtype=np.int64)
+
+    @classmethod
+    def from_prices(cls, prices) -> 'RollingVolatility':
+        prices = np.asarray(prices, dtype=np.float64)
+        estimator = cls(prices.shape[1], capacity=max(len(prices), 1))
+        estimator.extend(prices)
+        return estimator
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def missing(self) -> np.ndarray:
+        return self._missing[:self.count + 1]
+
+    def _reserve(self, rows: int) -> None:
+        needed = self.count + rows
+        if needed > len(self._sums):
+            capacity = max(needed, 2 * len(self._sums))
+            for name in ['_sums', '_sq_sums', '_missing']:
+                old = getattr(self, name)
+                new = np.zeros((capacity + (name == '_missing'), self.n_assets), dtype=old.dtype)
+                new[:len(old)] = old
+                setattr(self, name, new)
+
+    def append(self, prices) -> None:
+        self.extend(np.asarray(prices, dtype=np.float64).reshape(1, self.n_assets))
+
+    def extend(self, prices) -> None:
+        prices = np.asarray(prices, dtype=np.float64)
+        rows = len(prices)
+        if rows == 0:
+            return
+        self._reserve(rows)
+
+        if self._last is None:
+            base, offset = prices, 0.0
+        else:
+            base, offset = np.vstack([self._last[None, :], prices]), self._sums[self.count - 1]
+        logreturns = log_returns(base)
+
+        start = self.count
+        if self._last is None:
+            # The first price has no return
+            self._sums[0] = 0.0
+            self._sq_sums[0] = 0.0
+            start += 1
+        self._sums[start:self.count + rows] = offset + logreturns.cumsum(axis=0)
+        self._sq_sums[start:self.count + rows] = \
+            (0.0 if self._last is None else self._sq_sums[self.count - 1]) + (logreturns ** 2).cumsum(axis=0)
+
+        with np.errstate(invalid='ignore'):
+            missing = ~(prices > 0)
+        self._missing[self.count + 1:self.count + rows + 1] = self._missing[self.count] + missing.cumsum(axis=0)
+
+        self.count += rows
+        self._last = prices[-1].copy()
+
+    def vol(self, window: int, stop: int = None, annualization=1.0, columns=None) -> np.ndarray:
+        """
+        Volatility of the log returns over the `window` prices before row `stop`
+        (all appended rows by default), scaled by sqrt(annualization).
+        NaN where a price in the window is missing.
+        """
+        stop = self.count if stop is None else stop
+        start = stop - window
+        columns = slice(None) if columns is None else columns
+        if start < 0 or window < 3:
+            return np.full(self.n_assets, np.nan)[columns]
+
+        count = window - 1
+        total = self._sums[stop - 1, columns] - self._sums[start, columns]
+        total_sq = self._sq_sums[stop - 1, columns] - self._sq_sums[start, columns]
+        variance = np.maximum(total_sq - total ** 2 / count, 0.0) / (count - 1)
+
+        vol = np.sqrt(annualization * variance)
+        vol[(self._missing[stop, columns] - self._missing[start, columns]) != 0] = np.nan
+        return vol
+
+
+class EwmaVolatility:
+    """
+    Exponentially weighted volatility of daily log returns, updated in
+    O(tickers) per session. The estimate after every row is kept so it
+    can be read point-in-time. Missing prices leave the estimate unchanged.
+    """
+
+    def __init__(self, n_assets: int, halflife: float, capacity=512) -> None:
+        self.n_assets = n_assets
+        self.decay = 0.5 ** (1.0 / halflife)
+        self.count = 0
+        self._last = None
+        self._variance = np.zeros(n_assets)
+        # Sum of the weights, corrects the bias of starting from zero
+        self._weight = np.zeros(n_assets)
+        self._history = np.full((capacity, n_assets), np.nan)
+
+    @classmethod
+    def from_prices(cls, prices, halflife: float) -> 'EwmaVolatility':
+        prices = np.asarray(prices, dtype=np.float64)
+        estimator = cls(prices.shape[1], halflife, capacity=max(len(prices), 1))
+        estimator.extend(prices)
+        return estimator
+
+    def __len__(self):
+        return self.count
+
+    def append(self, prices) -> None:
+        prices = np.asarray(prices, dtype=np.float64).reshape(self.n_assets)
+        if self.count == len(self._history):
+            history = np.full((2 * len(self._history), self.n_assets), np.nan)
+            history[:self.count] = self._history
+            self._history = history
+
+        if self._last is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                logreturn = np.log(prices / self._last)
+            valid = np.isfinite(logreturn)
+            self._variance[valid] = self.decay * self._variance[valid] + (1 - self.decay) * logreturn[valid] ** 2
+            self._weight[valid] = self.decay * self._weight[valid] + (1 - self.decay)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self._history[self.count] = np.where(self._weight > 0, self._variance / self._weight, np.nan)
+
+        # Keep the last known price of tickers without a price today
+        if self._last is None:
+            self._last = prices.copy()
+        else:
+            self._last = np.where(prices > 0, prices, self._last)
+        self.count += 1
+
+    def extend(self, prices) -> None:
+        for row in np.asarray(prices, dtype=np.float64):
+            self.append(row)
+
+    def vol(self, window: int = None, stop: int = None, annualization=1.0, columns=None) -> np.ndarray:
+        # window is accepted for interchangeability with RollingVolatility
+        stop = self.count if stop is None else stop
+        columns = slice(None) if columns is None else columns
+        if stop <= 0:
+            return np.full(self.n_assets, np.nan)[columns]
+        return np.sqrt(annualization * self._history[stop - 1, columns])
+
+
+def log_returns(prices: np.ndarray) -> np.ndarray:
+    # Returns next to a missing price count as zero, windows containing one are masked out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logreturns = np.log(prices[1:] / prices[:-1])
+    logreturns[~np.isfinite(logreturns)] = 0.0
+    return logreturns
+
+
+def inverse_vol_weights(vol: np.ndarray, vol_scale: float) -> np.ndarray:
+    """
+    Weights proportional to vol_scale / vol, summing to one over the
+    tickers with a non-zero volatility. Other tickers get no weight.
+    """
+    vol = np.asarray(vol, dtype=np.float64)
+    inverse_vol = np.zeros(len(vol))
+    scaled = np.isfinite(vol) & (vol != 0)
+    inverse_vol[scaled] = vol_scale / vol[scaled]
+    total = inverse_vol.sum()
+    return inverse_vol / total if total > 0 else inverse_vol
+
+
+@lru_cache(maxsize=None)
+def panel_volatility(path, halflife=None):
+    # Built once per process over the whole price panel and shared by every run
+    prices = open_price_panel(path).adj_close
+    if halflife is None:
+        return RollingVolatility.from_prices(prices)
+    return EwmaVolatility.from_prices(prices, halflife)
@@ -0,0 +1,120 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from main import START, END, strategy_grid
+from metrics import summary
+from strategies.vectorized import VectorizedBacktest
+from sweep import cell_id, expand
+from utils.price_panel import build_price_panel, open_price_panel
+from utils.results_store import ResultsStore
+
+"""
+Walk-forward evaluation: the period is split into rolling train/test
+folds, the best strategy of every train window (by a metrics.summary
+column) is run on the following test window from cash, and the test
+segments are chained into one out-of-sample return series.
+
+The price panel, the volatility prefix sums and the listing dates are
+built once. The in-sample metrics of every fold are slices of a single
+grid run over the whole period, and each test window is simulated for
+the chosen strategy only, so N folds cost about one pass over the data.
+"""
+
+METRICS = ['sharpe_ratio', 'sortino_ratio', 'calmar_ratio', 'annual_return', 'total_return']
+
+GROUP = 'WALK_FORWARD'
+
+
+def make_folds(start, end, train_months=36, test_months=12, anchored=False) -> list:
+    """
+    (train start, train end, test start, test end) in UTC, test windows follow each
+    other without gaps. Windows start on the first day of a month: both engines
+    rebalance on the first session of a month, a window starting later would sit
+    in cash until the next one.
+    """
+    start = pd.Timestamp('{}-{:02d}-01'.format(start.year, start.month), tz='UTC')
+    end = pd.Timestamp(end.date().isoformat(), tz='UTC')
+    folds = []
+    test_start = start + pd.DateOffset(months=train_months)
+    while test_start <= end:
+        test_end = min(test_start + pd.DateOffset(months=test_months), end + pd.Timedelta(days=1))
+        train_start = start if anchored else test_start - pd.DateOffset(months=train_months)
+        folds.append((train_start, test_start - pd.Timedelta(days=1), test_start, test_end - pd.Timedelta(days=1)))
+        test_start = test_start + pd.DateOffset(months=test_months)
+    return folds
+
+
+def strategy_names(strategies) -> list:
+    # strategy_id where it is unique, as in the main grid, otherwise the sweep cell id
+    ids = [strategy.strategy_id() for strategy in strategies]
+    return ids if len(set(ids)) == len(ids) else [cell_id(strategy) for strategy in strategies]
+
+
+def walk_forward(backtest: VectorizedBacktest, strategies, folds, metric='sharpe_ratio') -> (pd.Series, pd.DataFrame):
+    names = strategy_names(strategies)
+    returns = backtest.run_grid(strategies)
+    returns.columns = names
+
+    segments = []
+    rows = []
+    for train_start, train_end, test_start, test_end in folds:
+        in_sample = summary(returns.loc[train_start:train_end])[metric]
+        if not in_sample.notnull().any():
+            continue
+        chosen = in_sample.idxmax()
+
+        segment = backtest.between(test_start, test_end).run(strategies[names.index(chosen)])
+        segments.append(segment)
+
+        out_of_sample = summary(segment.to_frame(chosen)).iloc[0]
+        rows.append({
+            'train_start': train_start,
+            'train_end': train_end,
+            'test_start': test_start,
+            'test_end': test_end,
+            'strategy': chosen,
+            'in_sample_' + metric: in_sample[chosen],
+            'out_of_sample_' + metric: out_of_sample[metric],
+            'out_of_sample_total_return': out_of_sample['total_return']
+        })
+
+    chained = pd.concat(segments) if segments else pd.Series()
+    return chained, pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Walk-forward evaluation with rolling train/test folds')
+    parser.add_argument('--bundle', default='database_bundle2')
+    parser.add_argument('--grid', default=None, metavar='PATH', help='JSON grid file as in sweep.py, the main grid if omitted')
+    parser.add_argument('--train-months', type=int, default=36)
+    parser.add_argument('--test-months', type=int, default=12)
+    parser.add_argument('--anchored', action='store_true', help='train windows all start at the first session')
+    parser.add_argument('--metric', choices=METRICS, default='sharpe_ratio')
+    parser.add_argument('--out', default='data/out/walk_forward')
+    args = parser.parse_args()
+
+    strategies = strategy_grid()
+    if args.grid:
+        with open(args.grid) as f:
+            strategies = expand(json.load(f))
+
+    start = time.time()
+    backtest = VectorizedBacktest(open_price_panel(str(build_price_panel(args.bundle))), start=START, end=END)
+    folds = make_folds(START, END, args.train_months, args.test_months, args.anchored)
+    returns, table = walk_forward(backtest, strategies, folds, args.metric)
+
+    outdir = Path(args.out)
+    outdir.mkdir(parents=True, exist_ok=True)
+    table.to_csv(str(outdir / 'folds.csv'), index=False)
+    strategy_id = 'WF_{}_{}_{}{}'.format(args.metric, args.train_months, args.test_months,
+                                          '_anchored' if args.anchored else '')
+    ResultsStore().write(GROUP, strategy_id, returns)
+
+    print(table.to_string())
+    print(summary(returns.to_frame(strategy_id)).T.to_string())
+    print('Walked {} folds over {} strategies in {:1.1f} seconds'.format(len(table), len(strategies),
+                                                                        time.time() - start))